@@ -0,0 +1,189 @@
+import os
+import subprocess
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from download_utils import CACHE_DIR, path_lock, source_hash, temp_path
+from trace_utils import span
+from concurrency_utils import stage_slot
+
+AUDIO_CACHE_DIR = os.path.join(CACHE_DIR, 'audio')
+SAMPLE_RATE = 16000
+FRAME = 400          # 25 ms analysis window
+HOP = 160            # 10 ms between frames
+N_FFT = 512
+READ_SAMPLES = SAMPLE_RATE * 30
+
+# Columns of the per-frame feature array.
+RMS_DB, FLUX, SPEECH_RATIO, VAD = range(4)
+SILENCE_DB = -60.0
+TARGET_RMS_DB = -16.0
+MAX_GAIN_DB = 12.0
+
+_WINDOW = np.hanning(FRAME).astype(np.float32)
+_FREQS = np.fft.rfftfreq(N_FFT, 1.0 / SAMPLE_RATE)
+_SPEECH_BAND = (_FREQS >= 300) & (_FREQS <= 3400)
+
+
+def read_pcm(path: str, block: int = READ_SAMPLES) -> Iterator[np.ndarray]:
+    """Mono 16 kHz float32 PCM from any media file, in blocks of `block` samples."""
+    cmd = ['ffmpeg', '-loglevel', 'error', '-i', path, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        while True:
+            buf = proc.stdout.read(block * 2)
+            if not buf:
+                break
+            yield np.frombuffer(buf[:len(buf) // 2 * 2], np.int16).astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def frame_features(blocks: Iterator[np.ndarray]) -> np.ndarray:
+    """One streaming pass: per 10 ms frame RMS (dBFS), spectral flux and speech-band energy ratio.
+
+    Frames are strided views over each block (plus the carried-over tail of the previous
+    one), so the PCM is never copied into per-frame arrays. VAD is filled in afterwards.
+    """
+    out: List[np.ndarray] = []
+    carry = np.zeros(0, np.float32)
+    prev_mag: Optional[np.ndarray] = None
+    for block in blocks:
+        x = np.concatenate([carry, block]) if len(carry) else block
+        if len(x) < FRAME:
+            carry = x
+            continue
+        frames = sliding_window_view(x, FRAME)[::HOP]
+        carry = x[len(frames) * HOP:]
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        mag = np.abs(np.fft.rfft(frames * _WINDOW, N_FFT, axis=1)).astype(np.float32)
+        diff = np.diff(mag, axis=0, prepend=(prev_mag if prev_mag is not None else mag[:1]))
+        flux = np.maximum(diff, 0).sum(axis=1) / (mag.sum(axis=1) + 1e-6)
+        power = np.square(mag)
+        speech = power[:, _SPEECH_BAND].sum(axis=1) / (power.sum(axis=1) + 1e-9)
+        prev_mag = mag[-1:]
+        feats = np.zeros((len(frames), 4), np.float32)
+        feats[:, RMS_DB] = 20 * np.log10(rms + 1e-7)
+        feats[:, FLUX] = flux
+        feats[:, SPEECH_RATIO] = speech
+        out.append(feats)
+    return np.concatenate(out) if out else np.zeros((0, 4), np.float32)
+
+
+def voice_activity(feats: np.ndarray, hangover: int = 15) -> np.ndarray:
+    """Energy + speech-band VAD with an adaptive noise floor; short gaps (< hangover frames) are bridged."""
+    if not len(feats):
+        return np.zeros(0, bool)
+    db = feats[:, RMS_DB]
+    floor = max(np.percentile(db, 10), SILENCE_DB)
+    active = (db > floor + 10) & (db > SILENCE_DB + 5) & (feats[:, SPEECH_RATIO] > 0.3)
+    if hangover > 1:
+        kernel = np.ones(hangover, np.float32)
+        active = np.convolve(active.astype(np.float32), kernel, mode='same') > 0
+    return active
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end) index runs where mask is True."""
+    if not len(mask):
+        return []
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class AudioIndex:
+    """Per-frame audio features of one source (10 ms hop), memory-mapped from the cache."""
+
+    hop_s = HOP / SAMPLE_RATE
+
+    def __init__(self, feats: np.ndarray, path: Optional[str] = None):
+        self.feats = feats
+        self.path = path
+
+    def __len__(self) -> int:
+        return len(self.feats)
+
+    @property
+    def duration(self) -> float:
+        return len(self.feats) * self.hop_s
+
+    def _slice(self, t0: float, t1: float) -> np.ndarray:
+        a = max(0, int(t0 / self.hop_s))
+        b = min(len(self.feats), max(a, int(np.ceil(t1 / self.hop_s))))
+        return self.feats[a:b]
+
+    def silences(self, min_len: float = 0.3) -> List[Tuple[float, float]]:
+        """(start, end) seconds of non-speech runs at least min_len long."""
+        idle = np.asarray(self.feats[:, VAD]) < 0.5
+        return [(a * self.hop_s, b * self.hop_s) for a, b in _runs(idle) if (b - a) * self.hop_s >= min_len]
+
+    def loudness_db(self, t0: float, t1: float) -> float:
+        """Mean RMS level (dBFS) of the voiced part of [t0, t1) (all of it if nothing is voiced)."""
+        f = self._slice(t0, t1)
+        if not len(f):
+            return SILENCE_DB
+        voiced = f[f[:, VAD] > 0.5]
+        db = (voiced if len(voiced) else f)[:, RMS_DB]
+        return float(10 * np.log10(np.mean(np.power(10, db / 10)) + 1e-12))
+
+    def gain_to_target(self, t0: float, t1: float, target_db: float = TARGET_RMS_DB) -> float:
+        """dB of gain that brings the clip's speech level to target_db (bounded to +-MAX_GAIN_DB)."""
+        level = self.loudness_db(t0, t1)
+        if level <= SILENCE_DB:
+            return 0.0
+        return float(np.clip(target_db - level, -MAX_GAIN_DB, MAX_GAIN_DB))
+
+    def excitement(self, window: float = 1.0) -> np.ndarray:
+        """Per-frame score of loudness above the median plus spectral flux, averaged over `window` seconds.
+
+        Loudness spikes and broadband bursts (laughter, applause, shouting) score high.
+        """
+        if not len(self.feats):
+            return np.zeros(0, np.float32)
+        db = np.asarray(self.feats[:, RMS_DB])
+        flux = np.asarray(self.feats[:, FLUX])
+        score = np.maximum(db - np.median(db), 0) / 10 + flux / (np.median(flux) + 1e-6) / 10
+        n = max(1, int(window / self.hop_s))
+        return np.convolve(score, np.ones(n, np.float32) / n, mode='same')
+
+    def peaks(self, top: int = 8, min_gap: float = 10.0) -> List[float]:
+        """Times (seconds) of the strongest excitement peaks, at least min_gap apart."""
+        score = self.excitement()
+        picked: List[int] = []
+        gap = int(min_gap / self.hop_s)
+        for i in np.argsort(score)[::-1]:
+            if len(picked) >= top or score[i] <= 0:
+                break
+            if all(abs(int(i) - p) >= gap for p in picked):
+                picked.append(int(i))
+        return sorted(round(p * self.hop_s, 2) for p in picked)
+
+
+def build_audio_index(path: str, root: str = AUDIO_CACHE_DIR) -> AudioIndex:
+    """Audio features for a source, computed once and memory-mapped from videos/cache/audio/.
+
+    Concurrent callers for the same source wait on one computation instead of repeating it.
+    """
+    os.makedirs(root, exist_ok=True)
+    cache_path = os.path.join(root, f"{source_hash(path)}_{SAMPLE_RATE // 1000}k_{HOP}.npy")
+    with path_lock(cache_path):
+        if not os.path.exists(cache_path):
+            with stage_slot('cpu'), span('audio_features') as sp:
+                feats = frame_features(read_pcm(path))
+                feats[:, VAD] = voice_activity(feats)
+                sp.frames = len(feats)
+                sp.add_file_io(read_path=path)
+            tmp = temp_path(cache_path)
+            try:
+                with open(tmp, 'wb') as f:
+                    np.save(f, feats)
+                os.replace(tmp, cache_path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+    return AudioIndex(np.load(cache_path, mmap_mode='r'), path)
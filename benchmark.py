@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the pipeline stages.
+
+Generates synthetic media (media_fixtures: ffmpeg testsrc video with a moving
+drawn face, speech-like tone audio, a synthetic SRT), runs each stage against it with a
+mocked LLM provider and writes the timings as JSON. Pass --baseline to compare
+against an earlier results file; regressions beyond --tolerance exit non-zero.
+--imports also times importing each entry module (and `run_pipeline.py --help`)
+in a fresh interpreter and lists the heavy dependencies each one loads.
+
+    python benchmark.py --sizes small,medium --out bench.json
+    python benchmark.py --sizes small,medium --baseline bench.json
+    python benchmark.py --sizes '' --imports
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from media_fixtures import MEDIA_DIR, SIZES, ensure_ffmpeg_on_path, ffmpeg_exe, fixtures
+from trace_utils import Tracer
+
+STAGES = ['srt_parse', 'subtitles', 'llm', 'boundaries', 'audio_features', 'face_track', 'face_track_cached', 'crop_render', 'multi_aspect', 'karaoke_burn', 'packaging']
+IMPORT_TARGETS = ['run_pipeline', 'pipeline_advanced', 'llm_utils', 'video_utils', 'subs_utils', 'download_utils',
+                  'job_server']
+HEAVY_MODULES = ('torch', 'cv2', 'faster_whisper', 'whisper', 'ctranslate2', 'moviepy', 'openai',
+                 'google.generativeai', 'pytubefix', 'gradio')
+
+
+# -------------- Mocked LLM --------------
+
+def mock_provider(seconds: float, clip_len: float) -> Callable[[str, str, str, float], str]:
+    """Deterministic stand-in for OpenAI/Gemini: evenly spaced highlights, canned titles."""
+    def complete(prompt: str, system: str, api_key: str, temperature: float) -> str:
+        if system:
+            n = max(1, int(seconds // clip_len))
+            return json.dumps([{'start': i*clip_len, 'end': (i+1)*clip_len, 'content': f'moment {i+1}'}
+                               for i in range(n)])
+        return json.dumps([f'Clip {i+1} 🔥' for i in range(len(json.loads(prompt.split('\n', 1)[1])))])
+    return complete
+
+
+# -------------- Stages --------------
+
+def run_size(size: str, tier: str = 'final', repeat: int = 1, stages: Optional[List[str]] = None,
+             media_dir: str = MEDIA_DIR, logger=print) -> Dict:
+    """Run every stage `repeat` times on one input size; returns per-stage metrics (median wall time)."""
+    from subs_utils import parse_srt_segments, words_from_segs, write_srt_for_range, write_ass_karaoke, burn_ass_to_video
+    from llm_utils import register_provider, pick_highlights, generate_titles_from_highlights
+    from package_utils import ClipPackager
+
+    w, h, seconds, fps = SIZES[size]
+    fx = fixtures(size, media_dir)
+    work = tempfile.mkdtemp(prefix=f'bench_{size}_')
+    clip_len = max(1.0, seconds / 3)
+    register_provider('Mock', mock_provider(seconds, clip_len))
+    tracer = Tracer()
+    state: Dict = {'segs': words_from_segs(parse_srt_segments(fx['srt'])), 'centers': None}
+    state['highs'] = [{'start': i*clip_len, 'end': (i+1)*clip_len} for i in range(int(seconds // clip_len))]
+
+    def srt_parse(sp):
+        segs = words_from_segs(parse_srt_segments(fx['srt']))
+        sp.attrs['segments'] = len(segs)
+
+    def subtitles(sp):
+        for i, hl in enumerate(state['highs'], start=1):
+            write_srt_for_range(state['segs'], os.path.join(work, f'clip_{i}.srt'), hl['start'], hl['end'])
+            write_ass_karaoke(state['segs'], os.path.join(work, f'clip_{i}.ass'), hl['start'], hl['end'], (1080, 1920))
+        write_ass_karaoke(state['segs'], os.path.join(work, 'full.ass'), 0, seconds, (w, h))
+
+    def llm(sp):
+        text = ' '.join(s['text'] for s in state['segs'])
+        highs = pick_highlights(text, 'Mock', 'mock', 10, 1, int(seconds))
+        generate_titles_from_highlights(highs, 'Mock', 'mock')
+        sp.attrs['highlights'] = len(highs)
+
+    def boundaries(sp):
+        from boundary_utils import refine_highlights
+        raw = [{'start': h['start'] + 0.3, 'end': h['end'] - 0.3} for h in state['highs']] * 100
+        highs = refine_highlights(raw, state['segs'], 1, seconds)
+        sp.attrs['highlights'] = len(highs)
+
+    def audio_features(sp):
+        from audio_features import build_audio_index
+        idx = build_audio_index(fx['video'], root=tempfile.mkdtemp(dir=work))
+        sp.frames = len(idx)
+        sp.attrs['silences'] = len(idx.silences())
+
+    def face_track(sp):
+        from face_store import FaceTrackStore
+        store = FaceTrackStore(fx['video'], root=tempfile.mkdtemp(dir=work))
+        state['face_root'] = os.path.dirname(store.cache_path)
+        sp.frames = store.ensure(0, seconds)
+        state['centers'] = store.centers(0, seconds)
+
+    def face_track_cached(sp):
+        from face_store import FaceTrackStore
+        if not state.get('face_root'):
+            face_track(sp)
+        store = FaceTrackStore(fx['video'], root=state['face_root'])
+        sp.frames = store.ensure(0, seconds)
+        state['centers'] = store.centers(0, seconds)
+
+    def _render(ratios):
+        from frame_pipeline import CropTarget, render_crops
+        from video_utils import aspect_tag, crop_path_from_centers
+        centers = state.get('centers')
+        targets = [CropTarget(os.path.join(work, f'crop_{aspect_tag(r)}.mp4'), r,
+                              crop_path_from_centers(centers, w, h, r) if centers else None) for r in ratios]
+        return render_crops(fx['video'], 0, seconds, targets, tier)
+
+    def crop_render(sp):
+        out = _render(['9:16'])
+        sp.frames = int(seconds * fps)
+        sp.add_file_io(fx['video'], out[0])
+
+    def multi_aspect(sp):
+        _render(['9:16', '1:1', '16:9'])
+        sp.frames = int(seconds * fps)
+
+    def karaoke_burn(sp):
+        ass = os.path.join(work, 'full.ass')
+        if not os.path.exists(ass):
+            write_ass_karaoke(state['segs'], ass, 0, seconds, (w, h))
+        burn_ass_to_video(fx['video'], ass, os.path.join(work, 'karaoke.mp4'), tier)
+        sp.frames = int(seconds * fps)
+
+    def packaging(sp):
+        zip_path = os.path.join(work, 'results.zip')
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        with ClipPackager(zip_path) as p:
+            for name in sorted(os.listdir(work)):
+                if not name.endswith('.zip'):
+                    p.add(os.path.join(work, name), name)
+            p.add(fx['video'], os.path.basename(fx['video']))
+        sp.add_file_io(written_path=zip_path)
+
+    funcs = {'srt_parse': srt_parse, 'subtitles': subtitles, 'llm': llm, 'boundaries': boundaries, 'face_track': face_track,
+             'audio_features': audio_features, 'face_track_cached': face_track_cached,
+             'crop_render': crop_render, 'multi_aspect': multi_aspect, 'karaoke_burn': karaoke_burn, 'packaging': packaging}
+    results: Dict[str, Dict] = {}
+    try:
+        for name in stages or STAGES:
+            runs = []
+            error = None
+            for _ in range(max(1, repeat)):
+                try:
+                    with tracer.span(name, size=size) as sp:
+                        funcs[name](sp)
+                    runs.append(sp.record)
+                except Exception as ex:
+                    error = f"{type(ex).__name__}: {ex}"
+                    break
+            if error:
+                results[name] = {'error': error}
+                logger(f"  {size:>6} {name:<17} failed: {error}")
+                continue
+            walls = [r['wall_s'] for r in runs]
+            best = runs[walls.index(sorted(walls)[len(walls) // 2])]
+            results[name] = {'wall_s': statistics.median(walls), 'min_wall_s': min(walls), 'runs': walls,
+                             **{k: best[k] for k in ('cpu_s', 'peak_rss_bytes', 'frames', 'bytes_read', 'bytes_written')}}
+            logger(f"  {size:>6} {name:<17} {results[name]['wall_s']:8.3f}s")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return {'spec': {'width': w, 'height': h, 'seconds': seconds, 'fps': fps}, 'stages': results}
+
+
+# -------------- Import time --------------
+
+_IMPORT_SNIPPET = '''
+import json, sys, time
+t0 = time.perf_counter()
+{body}
+dt = time.perf_counter() - t0
+print(json.dumps({{"import_s": dt, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+'''
+
+_HELP_BODY = '''import runpy
+sys.argv = ['run_pipeline.py', '--help']
+try:
+    runpy.run_path('run_pipeline.py', run_name='__main__')
+except SystemExit:
+    pass'''
+
+
+def measure_imports(targets: Optional[List[str]] = None, repeat: int = 3, logger=print) -> Dict[str, Dict]:
+    """Import each module (plus `run_pipeline.py --help`) in a fresh interpreter.
+
+    wall_s is the import itself, process_s includes interpreter startup; heavy lists
+    the HEAVY_MODULES left in sys.modules afterwards.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    cases = {t: f'import {t}' for t in (targets or IMPORT_TARGETS)}
+    cases['run_pipeline --help'] = _HELP_BODY
+    results: Dict[str, Dict] = {}
+    for name, body in cases.items():
+        code = _IMPORT_SNIPPET.format(body=body, heavy=HEAVY_MODULES)
+        walls, procs, heavy, error = [], [], [], None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            r = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True)
+            procs.append(time.perf_counter() - t0)
+            if r.returncode != 0:
+                error = (r.stderr.strip().splitlines() or ['failed'])[-1]
+                break
+            m = json.loads(r.stdout.strip().splitlines()[-1])
+            walls.append(m['import_s'])
+            heavy = m['heavy']
+        if error:
+            results[name] = {'error': error}
+            logger(f"  import {name:<22} failed: {error}")
+            continue
+        results[name] = {'wall_s': statistics.median(walls), 'process_s': statistics.median(procs),
+                         'runs': walls, 'heavy': heavy}
+        logger(f"  import {name:<22} {results[name]['wall_s']:7.3f}s  heavy: {', '.join(heavy) or '-'}")
+    return results
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        commit = ''
+    try:
+        ff = subprocess.run([ffmpeg_exe(), '-version'], capture_output=True, text=True).stdout.splitlines()[0]
+    except Exception:
+        ff = ''
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'ffmpeg': ff, 'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_benchmark(sizes: List[str], tier: str = 'final', repeat: int = 1, stages: Optional[List[str]] = None,
+                  media_dir: str = MEDIA_DIR, logger=print, imports: bool = False) -> Dict:
+    ensure_ffmpeg_on_path()
+    out = {'meta': environment(), 'tier': tier, 'repeat': repeat, 'sizes': {}}
+    if imports:
+        logger('Benchmarking import time')
+        out['imports'] = measure_imports(repeat=repeat, logger=logger)
+    for size in sizes:
+        logger(f"Benchmarking {size} {SIZES[size][0]}x{SIZES[size][1]} {SIZES[size][2]}s ({tier})")
+        out['sizes'][size] = run_size(size, tier, repeat, stages, media_dir, logger)
+    return out
+
+
+def _pairs(current: Dict, baseline: Dict):
+    """(size, stage, current, baseline) metrics for every timing present in both runs."""
+    sections = [(size, cur.get('stages', {}), baseline.get('sizes', {}).get(size, {}).get('stages', {}))
+                for size, cur in current.get('sizes', {}).items()]
+    if current.get('imports'):
+        sections.append(('imports', current['imports'], baseline.get('imports', {})))
+    for size, cur, base in sections:
+        for stage, m in cur.items():
+            b = base.get(stage) or {}
+            if 'wall_s' in m and 'wall_s' in b:
+                yield size, stage, m, b
+
+
+def compare_results(current: Dict, baseline: Dict, tolerance: float = 0.25, min_delta: float = 0.05) -> List[Dict]:
+    """Stages whose median wall time grew by more than tolerance (and min_delta seconds) over the baseline."""
+    regressions = []
+    for size, stage, m, b in _pairs(current, baseline):
+        ratio = m['wall_s'] / max(b['wall_s'], 1e-9)
+        if ratio > 1 + tolerance and m['wall_s'] - b['wall_s'] > min_delta:
+            regressions.append({'size': size, 'stage': stage, 'baseline_s': b['wall_s'],
+                                'current_s': m['wall_s'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def format_comparison(current: Dict, baseline: Dict) -> str:
+    lines = [f"{'size':<8}{'stage':<22}{'baseline':>10}{'current':>10}{'change':>9}"]
+    for size, stage, m, b in _pairs(current, baseline):
+        change = f"{(m['wall_s'] / max(b['wall_s'], 1e-9) - 1) * 100:+.0f}%"
+        lines.append(f"{size:<8}{stage:<22}{b['wall_s']:>9.3f}s{m['wall_s']:>9.3f}s{change:>9}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark pipeline stages on synthetic media')
+    p.add_argument('--sizes', default='small,medium', help=f"Comma-separated input sizes: {', '.join(SIZES)}")
+    p.add_argument('--stages', default=','.join(STAGES), help='Comma-separated stages to run')
+    p.add_argument('--tier', choices=['preview', 'final'], default='final', help='Encode tier for render stages')
+    p.add_argument('--repeat', type=int, default=3, help='Runs per stage; the median is reported')
+    p.add_argument('--media-dir', default=MEDIA_DIR, help='Where synthetic fixtures are generated and reused')
+    p.add_argument('--out', default='bench_results.json', help='Results JSON path')
+    p.add_argument('--baseline', help='Earlier results JSON to compare against')
+    p.add_argument('--imports', action='store_true', help='Also time module imports and `run_pipeline.py --help`')
+    p.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before a stage counts as a regression')
+    args = p.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in stages if s not in STAGES]
+    if unknown:
+        p.error(f"unknown size/stage: {', '.join(unknown)}")
+
+    results = run_benchmark(sizes, args.tier, args.repeat, stages, args.media_dir, imports=args.imports)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved -> {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(format_comparison(results, baseline))
+        regressions = compare_results(results, baseline, args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['size']}/{r['stage']}: {r['baseline_s']:.3f}s -> {r['current_s']:.3f}s (x{r['ratio']})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SENTENCE_END = ('.', '!', '?', '…')
+PAUSE = 0.3       # gap between words that counts as a pause (seconds)
+PAD = 0.15        # room left before the first / after the last word of a clip
+SNAP_TOL = 1.5    # how far a boundary may move to reach a word or silence edge
+MAX_OVERLAP = 0.5  # highlights sharing more than this fraction of the shorter one are duplicates
+
+
+class BoundaryIndex:
+    """Sorted cut-point candidates for a transcript, for snapping clip starts and ends.
+
+    Candidates come in tiers (sentence edges, then pauses/silences, then any word edge);
+    each tier is a sorted list searched with bisect, so snapping a clip costs a few
+    microseconds however long the source is.
+    """
+
+    def __init__(self, segs: Sequence[Dict], silences: Sequence[Tuple[float, float]] = (),
+                 duration: Optional[float] = None):
+        words = [w for s in segs for w in (s.get('words') or [s])]
+        words.sort(key=lambda w: w['start'])
+        starts: List[List[float]] = [[], [], []]
+        ends: List[List[float]] = [[], [], []]
+        seg_starts = {round(float(s['start']), 3) for s in segs}
+        seg_ends = {round(float(s['end']), 3) for s in segs}
+        for k, w in enumerate(words):
+            ws, we = float(w['start']), float(w['end'])
+            prev_end = float(words[k - 1]['end']) if k else None
+            next_start = float(words[k + 1]['start']) if k + 1 < len(words) else None
+            lead = PAD if prev_end is None else max(0.0, min(PAD, (ws - prev_end) / 2))
+            tail = PAD if next_start is None else max(0.0, min(PAD, (next_start - we) / 2))
+            after_sentence = prev_end is None or str(words[k - 1].get('text', '')).rstrip().endswith(SENTENCE_END)
+            ends_sentence = next_start is None or str(w.get('text', '')).rstrip().endswith(SENTENCE_END)
+            after_pause = (prev_end is not None and ws - prev_end >= PAUSE) or round(ws, 3) in seg_starts
+            before_pause = (next_start is not None and next_start - we >= PAUSE) or round(we, 3) in seg_ends
+            starts[0 if after_sentence else 1 if after_pause else 2].append(ws - lead)
+            ends[0 if ends_sentence else 1 if before_pause else 2].append(we + tail)
+        for a, b in silences:
+            starts[1].append(max(a, b - PAD))
+            ends[1].append(min(b, a + PAD))
+        self.starts = [sorted(max(0.0, t) for t in tier) for tier in starts]
+        self.ends = [sorted(tier) for tier in ends]
+        self.duration = duration if duration is not None else (float(words[-1]['end']) + PAD if words else None)
+
+    @staticmethod
+    def _nearest(tiers: List[List[float]], t: float, tol: float) -> Optional[float]:
+        for tier in tiers:
+            i = bisect_left(tier, t)
+            near = [tier[j] for j in (i - 1, i) if 0 <= j < len(tier) and abs(tier[j] - t) <= tol]
+            if near:
+                return min(near, key=lambda c: abs(c - t))
+        return None
+
+    @staticmethod
+    def _within(tiers: List[List[float]], lo: float, hi: float, last: bool) -> Optional[float]:
+        """Best-tier candidate in [lo, hi]: the latest one if last, else the earliest."""
+        for tier in tiers:
+            i, j = bisect_left(tier, lo), bisect_right(tier, hi)
+            if i < j:
+                return tier[j - 1] if last else tier[i]
+        return None
+
+    def snap_start(self, t: float, tol: float = SNAP_TOL) -> float:
+        c = self._nearest(self.starts, t, tol)
+        return t if c is None else c
+
+    def snap_end(self, t: float, tol: float = SNAP_TOL) -> float:
+        c = self._nearest(self.ends, t, tol)
+        return t if c is None else c
+
+    def fit(self, s: float, e: float, min_len: float, max_len: float) -> Tuple[float, float]:
+        """Shorten or lengthen [s, e] into [min_len, max_len], preferring clean cut points."""
+        end_limit = self.duration if self.duration is not None else float('inf')
+        if e - s > max_len:
+            c = self._within(self.ends, s + min_len, s + max_len, last=True)
+            e = c if c is not None else s + max_len
+        elif e - s < min_len:
+            c = self._within(self.ends, s + min_len, min(s + max_len, end_limit), last=False)
+            if c is not None:
+                e = c
+            else:
+                c = self._within(self.starts, e - max_len, e - min_len, last=True)
+                if c is not None and c >= 0:
+                    s = c
+                else:
+                    e = min(s + min_len, end_limit)
+                    s = max(0.0, e - min_len)
+        return round(s, 3), round(e, 3)
+
+    def refine(self, s: float, e: float, min_len: float, max_len: float,
+               tol: float = SNAP_TOL) -> Tuple[float, float]:
+        s, e = self.snap_start(s, tol), self.snap_end(e, tol)
+        if self.duration is not None:
+            e = min(e, self.duration)
+        if e <= s:
+            # Start at or past the end of the source: move it back so a min_len clip still fits.
+            if self.duration is not None:
+                s = max(0.0, min(s, self.duration - min_len))
+            e = s + min_len
+            if self.duration is not None:
+                e = min(e, self.duration)
+        return self.fit(s, e, min_len, max_len)
+
+
+def _overlap(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    inter = min(a[1], b[1]) - max(a[0], b[0])
+    return max(0.0, inter) / max(1e-6, min(a[1] - a[0], b[1] - b[0]))
+
+
+def dedupe_highlights(highs: List[Dict], max_overlap: float = MAX_OVERLAP) -> List[Dict]:
+    """Drop highlights that mostly repeat an earlier (higher ranked) one; order is kept."""
+    kept: List[Dict] = []
+    for h in highs:
+        span_h = (float(h['start']), float(h['end']))
+        if all(_overlap(span_h, (k['start'], k['end'])) <= max_overlap for k in kept):
+            kept.append(h)
+    return kept
+
+
+def refine_highlights(highs: List[Dict], segs: Sequence[Dict], min_len: float, max_len: float,
+                      silences: Sequence[Tuple[float, float]] = (), duration: Optional[float] = None,
+                      tol: float = SNAP_TOL, index: Optional[BoundaryIndex] = None) -> List[Dict]:
+    """Snap LLM highlights to sentence/pause edges, fit them into [min_len, max_len] and dedupe.
+
+    The LLM's raw times are kept as llm_start/llm_end.
+    """
+    index = index or BoundaryIndex(segs, silences, duration)
+    out: List[Dict] = []
+    for h in highs:
+        s, e = index.refine(float(h['start']), float(h['end']), min_len, max_len, tol)
+        out.append(dict(h, start=s, end=e, llm_start=h['start'], llm_end=h['end']))
+    return dedupe_highlights(out)
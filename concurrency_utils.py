@@ -0,0 +1,41 @@
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# Stage kinds: 'cpu' for encodes, karaoke burns, face tracking and transcription;
+# 'io' for downloads and LLM calls. Unlimited unless an entry point (the job server)
+# sets limits, so single CLI runs behave as before.
+_SLOTS: Dict[str, Optional[threading.BoundedSemaphore]] = {'cpu': None, 'io': None}
+
+
+def set_stage_limits(cpu: Optional[int] = None, io: Optional[int] = None) -> None:
+    """Cap how many cpu/io stages may run at once across all threads (None = unlimited)."""
+    _SLOTS['cpu'] = threading.BoundedSemaphore(cpu) if cpu else None
+    _SLOTS['io'] = threading.BoundedSemaphore(io) if io else None
+
+
+def stage_limits() -> Dict[str, Optional[int]]:
+    return {k: (s._initial_value if s is not None else None) for k, s in _SLOTS.items()}
+
+
+@contextmanager
+def stage_slot(kind: str) -> Iterator[None]:
+    """Hold one slot of the given kind while the block runs."""
+    sem = _SLOTS.get(kind)
+    if sem is None:
+        yield
+        return
+    with sem:
+        yield
+
+
+def limited(kind: str):
+    """Decorator form of stage_slot() for whole functions."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_slot(kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
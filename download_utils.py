@@ -0,0 +1,352 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.request import Request, urlopen
+
+from mp4_index import load_index
+from trace_utils import span
+from concurrency_utils import stage_slot
+
+CACHE_DIR = os.path.join('videos', 'cache')
+CHUNK_SIZE = 4 * 1024 * 1024
+BLOCK = 64 * 1024
+HASH_BLOCK = 1024 * 1024
+
+# Per-path locks shared by every SourceCache / store instance in the process, so two
+# jobs writing the same cache file are serialized even with separate instances.
+_PATH_LOCKS: Dict[str, threading.Lock] = {}
+_PATH_LOCKS_GUARD = threading.Lock()
+
+# What we need to know about a remote stream; pytubefix streams are converted to this.
+StreamInfo = namedtuple('StreamInfo', 'itag url filesize subtype includes_audio')
+
+
+def path_lock(path: str) -> threading.Lock:
+    """Process-wide lock for a cache file path."""
+    key = os.path.abspath(path)
+    with _PATH_LOCKS_GUARD:
+        return _PATH_LOCKS.setdefault(key, threading.Lock())
+
+
+def temp_path(dest: str, suffix: str = '.part') -> str:
+    """Fresh temp file next to dest, for writing and then os.replace()-ing into place.
+
+    Unique per writer, so concurrent writers never truncate each other's data.
+    """
+    d = os.path.dirname(dest) or '.'
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(dest) + '.', suffix=suffix, dir=d)
+    os.close(fd)
+    return tmp
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ---------- Ranged HTTP fetch ----------
+
+def _probe(url: str, timeout: float) -> Tuple[Optional[int], bool]:
+    """Return (size, supports_ranges) using a one-byte range request."""
+    with urlopen(Request(url, headers={'Range': 'bytes=0-0'}), timeout=timeout) as r:
+        if r.status == 206:
+            cr = r.headers.get('Content-Range', '')
+            total = cr.rsplit('/', 1)[-1] if '/' in cr else '*'
+            return (int(total) if total.isdigit() else None), total.isdigit()
+        length = r.headers.get('Content-Length')
+        return (int(length) if length else None), False
+
+
+def _fetch_range(url: str, part: str, start: int, end: int, timeout: float, retries: int = 3,
+                 dst: Optional[int] = None) -> int:
+    """Fetch bytes start..end (inclusive) into part at dst (defaults to start)."""
+    last: Optional[Exception] = None
+    for _ in range(retries):
+        try:
+            req = Request(url, headers={'Range': f'bytes={start}-{end}'})
+            with urlopen(req, timeout=timeout) as r, open(part, 'r+b') as f:
+                if r.status != 206:
+                    raise IOError(f'Server ignored range {start}-{end} (HTTP {r.status})')
+                f.seek(start if dst is None else dst)
+                n = 0
+                while True:
+                    buf = r.read(BLOCK)
+                    if not buf:
+                        break
+                    f.write(buf)
+                    n += len(buf)
+            if n != end - start + 1:
+                raise IOError(f'Short read for range {start}-{end}: {n} bytes')
+            return n
+        except Exception as ex:
+            last = ex
+    raise last if last else IOError('range fetch failed')
+
+
+def fetch_ranged(url: str, dest: str, size: Optional[int] = None, chunk_size: int = CHUNK_SIZE, workers: int = 4,
+                 timeout: float = 30.0) -> str:
+    """Download url to dest using parallel byte-range requests.
+
+    Data goes to a unique temp file next to dest and is renamed on success, so a
+    finished dest is always complete. Falls back to a single streaming GET if the server does not
+    support ranges.
+    """
+    part = temp_path(dest)
+    try:
+        probed, ranged = _probe(url, timeout)
+        size = size or probed
+        if ranged and size:
+            with open(part, 'wb') as f:
+                f.truncate(size)
+            spans = [(a, min(size, a + chunk_size) - 1) for a in range(0, size, chunk_size)]
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+                list(ex.map(lambda sp: _fetch_range(url, part, sp[0], sp[1], timeout), spans))
+        else:
+            with urlopen(url, timeout=timeout) as r, open(part, 'wb') as f:
+                while True:
+                    buf = r.read(BLOCK)
+                    if not buf:
+                        break
+                    f.write(buf)
+        os.replace(part, dest)
+    except BaseException:
+        _discard(part)
+        raise
+    return dest
+
+
+def http_fetch(url: str, timeout: float = 30.0):
+    """fetch(offset, length) -> bytes over HTTP range requests (for mp4_index)."""
+    def fetch(offset: int, length: int) -> bytes:
+        req = Request(url, headers={'Range': f'bytes={offset}-{offset + length - 1}'})
+        with urlopen(req, timeout=timeout) as r:
+            return r.read()
+    return fetch
+
+
+def fetch_partial(url: str, dest: str, windows: List[Tuple[float, float]], size: Optional[int] = None,
+                  pad: float = 1.0, chunk_size: int = CHUNK_SIZE, workers: int = 4, timeout: float = 30.0) -> str:
+    """Download only the header and the media byte ranges covering windows (seconds).
+
+    Uses the container index (moov sample tables or sidx) to map times to bytes; the
+    result is a playable MP4 that can be seeked into any of the windows.
+    """
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    if not size:
+        size, _ = _probe(url, timeout)
+    index = load_index(http_fetch(url, timeout), size)
+    dest_size, plan, literals = index.partial_layout(windows, pad)
+    pieces = [(a, min(b, a + chunk_size), d + (a - src))
+              for src, b, d in plan for a in range(src, b, chunk_size)]
+    part = temp_path(dest)
+    try:
+        with open(part, 'wb') as f:
+            f.truncate(dest_size)
+            for off, data in literals:
+                f.seek(off)
+                f.write(data)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            list(ex.map(lambda p: _fetch_range(url, part, p[0], p[1] - 1, timeout, dst=p[2]), pieces))
+        os.replace(part, dest)
+    except BaseException:
+        _discard(part)
+        raise
+    return dest
+
+
+# ---------- Source cache ----------
+
+class SourceCache:
+    """On-disk cache of downloaded source streams keyed by video ID and stream itag."""
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = root
+
+    def path_for(self, video_id: str, itag, ext: str = 'mp4') -> str:
+        return os.path.join(self.root, f"{video_id}_{itag}.{ext}")
+
+    def get(self, video_id: str, itag, ext: str = 'mp4') -> Optional[str]:
+        p = self.path_for(video_id, itag, ext)
+        return p if os.path.exists(p) else None
+
+    def fetch(self, video_id: str, stream: StreamInfo, logger: Callable = print, **kw) -> str:
+        dest = self.path_for(video_id, stream.itag, stream.subtype or 'mp4')
+        with path_lock(dest):
+            if os.path.exists(dest):
+                logger(f"Source cache hit -> {dest}")
+                return dest
+            logger(f"Downloading itag {stream.itag} -> {dest}")
+            with stage_slot('io'), span('download_youtube', video_id=video_id, itag=stream.itag, partial=False) as sp:
+                fetch_ranged(stream.url, dest, stream.filesize, **kw)
+                sp.add_file_io(written_path=dest)
+                return dest
+
+    def fetch_windows(self, video_id: str, stream: StreamInfo, windows: List[Tuple[float, float]], pad: float = 1.0,
+                      logger: Callable = print, **kw) -> str:
+        """Partial copy of a stream covering windows; a fully cached stream is preferred."""
+        full = self.get(video_id, stream.itag, stream.subtype or 'mp4')
+        if full:
+            logger(f"Source cache hit -> {full}")
+            return full
+        key = hashlib.sha1(json.dumps([[round(a, 2), round(b, 2)] for a, b in windows] + [pad]).encode()).hexdigest()[:12]
+        dest = self.path_for(video_id, f"{stream.itag}_part{key}", stream.subtype or 'mp4')
+        with path_lock(dest):
+            if os.path.exists(dest):
+                logger(f"Source cache hit -> {dest}")
+                return dest
+            logger(f"Downloading {len(windows)} window(s) of itag {stream.itag} -> {dest}")
+            with stage_slot('io'), span('download_youtube', video_id=video_id, itag=stream.itag, partial=True) as sp:
+                fetch_partial(stream.url, dest, windows, stream.filesize, pad, **kw)
+                sp.add_file_io(written_path=dest)
+                return dest
+
+
+def source_hash(path: str) -> str:
+    """sha1 of the file size and its first, middle and last MiB; cheap even for multi-GB sources."""
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        for off in sorted({0, max(0, size // 2 - HASH_BLOCK // 2), max(0, size - HASH_BLOCK)}):
+            f.seek(off)
+            h.update(f.read(HASH_BLOCK))
+    return h.hexdigest()[:16]
+
+
+def mux_av(video_path: str, audio_path: str, out_path: str) -> str:
+    with path_lock(out_path):
+        if not os.path.exists(out_path):
+            tmp = temp_path(out_path, '.part.mp4')
+            try:
+                subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', video_path, '-i', audio_path,
+                                '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', tmp], check=True)
+                os.replace(tmp, out_path)
+            except BaseException:
+                _discard(tmp)
+                raise
+    return out_path
+
+
+# ---------- Audio-first source download ----------
+
+class SourceDownload:
+    """Audio and video downloads for one source, audio first.
+
+    audio_path() becomes available as soon as the (small) audio stream is done, so
+    transcription can run while the video stream is still downloading.
+    """
+
+    def __init__(self, video_id: str, audio: Optional[Future], video: Optional[Future], logger: Callable = print,
+                 cache: Optional[SourceCache] = None, streams: Tuple[Optional[StreamInfo], Optional[StreamInfo]] = (None, None),
+                 fetch_kw: Optional[dict] = None):
+        self.video_id = video_id
+        self._audio = audio
+        self._video = video
+        self._logger = logger
+        self._cache = cache
+        self._streams = streams
+        self._fetch_kw = fetch_kw or {}
+
+    def _result(self, fut: Optional[Future], what: str, timeout: Optional[float]) -> Optional[str]:
+        if fut is None:
+            return None
+        try:
+            return fut.result(timeout=timeout)
+        except Exception as ex:
+            self._logger(f"{what} download failed: {ex}")
+            return None
+
+    def audio_path(self, timeout: Optional[float] = None) -> Optional[str]:
+        return self._result(self._audio, 'Audio', timeout)
+
+    def video_path(self, timeout: Optional[float] = None) -> Optional[str]:
+        if self._video is None:
+            self._video = _submit(_fetch_video, self._cache, self.video_id, self._streams, self._audio,
+                                  self._logger, self._fetch_kw)
+        return self._result(self._video, 'Video', timeout)
+
+    def video_windows(self, windows: List[Tuple[float, float]], pad: float = 1.0) -> Optional[str]:
+        """Partial video covering only the given (start, end) windows, muxed with audio if needed.
+
+        Falls back to the full video if this download was started with fetch_video=True.
+        """
+        if self._video is not None or self._cache is None:
+            return self.video_path()
+        try:
+            audio, video = self._streams
+            vpath = self._cache.fetch_windows(self.video_id, video, windows, pad, self._logger, **self._fetch_kw)
+            if video.includes_audio or self._audio is None:
+                return vpath
+            apath = self._audio.result()
+            return mux_av(vpath, apath, os.path.splitext(vpath)[0] + f"+{audio.itag}.mp4")
+        except Exception as ex:
+            self._logger(f"Partial video download failed ({type(ex).__name__}: {ex}); "
+                         "downloading the full video instead.")
+            return self.video_path()
+
+
+def _submit(fn, *args, **kw) -> Future:
+    pool = ThreadPoolExecutor(max_workers=1)
+    fut = pool.submit(fn, *args, **kw)
+    pool.shutdown(wait=False)
+    return fut
+
+
+def _fetch_video(cache: SourceCache, video_id: str, streams: Tuple[Optional[StreamInfo], StreamInfo],
+                 audio_fut: Optional[Future], logger: Callable, fetch_kw: dict) -> str:
+    audio, video = streams
+    # The audio stream is a fraction of the video's size; giving it the link
+    # first gets transcription going as early as possible.
+    if audio_fut is not None:
+        wait([audio_fut])
+    vpath = cache.fetch(video_id, video, logger, **fetch_kw)
+    if video.includes_audio or audio_fut is None:
+        return vpath
+    apath = audio_fut.result()
+    return mux_av(vpath, apath, cache.path_for(video_id, f"{video.itag}+{audio.itag}", 'mp4'))
+
+
+def start_source_download(video_id: str, audio: Optional[StreamInfo], video: StreamInfo,
+                          cache: Optional[SourceCache] = None, workers: int = 4, logger: Callable = print,
+                          fetch_video: bool = True, **kw) -> SourceDownload:
+    """Start downloading a source, audio first.
+
+    With fetch_video=False only the audio is fetched up front; the video is fetched
+    later, either fully (video_path) or just the needed windows (video_windows).
+    """
+    cache = cache or SourceCache()
+    fetch_kw = dict(kw, workers=workers)
+    audio_fut = _submit(cache.fetch, video_id, audio, logger, **fetch_kw) if audio else None
+    video_fut = _submit(_fetch_video, cache, video_id, (audio, video), audio_fut, logger, fetch_kw) if fetch_video else None
+    return SourceDownload(video_id, audio_fut, video_fut, logger, cache, (audio, video), fetch_kw)
+
+
+def _stream_info(s) -> StreamInfo:
+    return StreamInfo(s.itag, s.url, s.filesize, s.subtype, bool(s.includes_audio_track))
+
+
+def resolve_youtube_streams(url: str) -> Tuple[str, Optional[StreamInfo], StreamInfo]:
+    from pytubefix import YouTube
+    yt = YouTube(url)
+    video = (yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first() or
+             yt.streams.filter(file_extension='mp4').order_by('resolution').desc().first())
+    audio = yt.streams.filter(only_audio=True, file_extension='mp4').order_by('abr').desc().first()
+    return yt.video_id, (_stream_info(audio) if audio else None), _stream_info(video)
+
+
+def start_youtube_download(url: str, cache: Optional[SourceCache] = None, workers: int = 4,
+                           logger: Callable = print, fetch_video: bool = True) -> Optional[SourceDownload]:
+    try:
+        video_id, audio, video = resolve_youtube_streams(url)
+    except Exception as ex:
+        logger(f"Could not resolve YouTube streams: {ex}")
+        return None
+    return start_source_download(video_id, audio, video, cache, workers, logger, fetch_video)
@@ -0,0 +1,46 @@
+from typing import Dict, List
+
+# Encode tiers. Everything is plain libx264/aac so the same settings work on
+# any machine (no NVENC/QSV/VideoToolbox assumptions).
+ENCODE_PROFILES: Dict[str, Dict] = {
+    'preview': {'preset': 'ultrafast', 'crf': 32, 'max_height': 480, 'audio_bitrate': '96k'},
+    'final': {'preset': 'medium', 'crf': 20, 'max_height': None, 'audio_bitrate': '192k'},
+}
+DEFAULT_TIER = 'final'
+
+
+def get_profile(tier: str) -> Dict:
+    if tier not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode tier '{tier}'. Choose from: {', '.join(ENCODE_PROFILES)}")
+    return ENCODE_PROFILES[tier]
+
+
+def scale_filter(tier: str) -> str:
+    """ffmpeg scale filter that caps the output height for the tier ('' if uncapped)."""
+    mh = get_profile(tier)['max_height']
+    return f"scale=-2:'min(ih,{mh})'" if mh else ''
+
+
+def ffmpeg_video_args(tier: str) -> List[str]:
+    p = get_profile(tier)
+    return ['-c:v', 'libx264', '-preset', p['preset'], '-crf', str(p['crf']), '-pix_fmt', 'yuv420p']
+
+
+def ffmpeg_audio_args(tier: str) -> List[str]:
+    return ['-c:a', 'aac', '-b:a', get_profile(tier)['audio_bitrate']]
+
+
+def write_kwargs(tier: str) -> Dict:
+    """Keyword arguments for MoviePy's write_videofile for the given tier."""
+    p = get_profile(tier)
+    params = ['-crf', str(p['crf']), '-pix_fmt', 'yuv420p']
+    vf = scale_filter(tier)
+    if vf:
+        params += ['-vf', vf]
+    return {
+        'codec': 'libx264',
+        'audio_codec': 'aac',
+        'preset': p['preset'],
+        'audio_bitrate': p['audio_bitrate'],
+        'ffmpeg_params': params,
+    }
@@ -0,0 +1,110 @@
+import math
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from download_utils import CACHE_DIR, path_lock, source_hash, temp_path
+from frame_pipeline import VideoInfo, probe_video, read_frames
+from video_utils import FaceBox, detect_boxes, smooth_centers
+
+FACE_CACHE_DIR = os.path.join(CACHE_DIR, 'faces')
+
+
+class FaceTrackStore:
+    """Face boxes for one source at a fixed sample rate, filled in lazily and cached on disk.
+
+    Sample k is the frame at k / sample_fps seconds. Each request decodes only the samples
+    that no earlier clip, aspect or run has analysed; the boxes are kept in
+    videos/cache/faces/<source hash>_<fps>fps.npz. Stores for the same file share a
+    process-wide lock, and each one picks up the samples the others saved before analysing.
+    """
+
+    def __init__(self, path: str, info: Optional[VideoInfo] = None, sample_fps: float = 4.0,
+                 root: str = FACE_CACHE_DIR):
+        self.path = path
+        self.info = info or probe_video(path)
+        self.sample_fps = sample_fps
+        n = int(math.ceil(self.info.duration * sample_fps)) + 1
+        self.boxes = np.full((n, 4), -1, np.int32)
+        self.done = np.zeros(n, bool)
+        os.makedirs(root, exist_ok=True)
+        self.cache_path = os.path.join(root, f"{source_hash(path)}_{sample_fps:g}fps.npz")
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path) as z:
+                m = min(len(self.done), len(z['done']))
+                new = z['done'][:m] & ~self.done[:m]
+                self.boxes[:m][new] = z['boxes'][:m][new]
+                self.done[:m] |= new
+        except Exception:
+            pass
+
+    def _save(self) -> None:
+        tmp = temp_path(self.cache_path)
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, boxes=self.boxes, done=self.done)
+            os.replace(tmp, self.cache_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _span(self, t0: float, t1: float) -> Tuple[int, int]:
+        k0 = max(0, int(math.ceil(t0 * self.sample_fps - 1e-6)))
+        k1 = min(len(self.done), int(math.ceil(t1 * self.sample_fps - 1e-6)))
+        return k0, max(k0, k1)
+
+    def missing_ranges(self, t0: float, t1: float) -> List[Tuple[int, int]]:
+        """Runs [k0, k1) of sample indices in [t0, t1) not analysed yet."""
+        k0, k1 = self._span(t0, t1)
+        runs: List[Tuple[int, int]] = []
+        k = k0
+        while k < k1:
+            if self.done[k]:
+                k += 1
+                continue
+            start = k
+            while k < k1 and not self.done[k]:
+                k += 1
+            runs.append((start, k))
+        return runs
+
+    def ensure(self, t0: float, t1: float) -> int:
+        """Analyse the missing samples of [t0, t1); returns how many were decoded."""
+        computed = 0
+        with path_lock(self.cache_path):
+            self._load()
+            runs = self.missing_ranges(t0, t1)
+            for a, b in runs:
+                frames = read_frames(self.path, a / self.sample_fps, b / self.sample_fps, fps=self.sample_fps,
+                                     info=self.info)
+                for n, (_, box) in enumerate(detect_boxes(frames)):
+                    if a + n >= b:
+                        break
+                    self.boxes[a + n] = box if box else (-1, -1, -1, -1)
+                    computed += 1
+                # Samples past the end of the decoded stream stay faceless rather than being retried.
+                self.done[a:b] = True
+            if runs:
+                self._save()
+        return computed
+
+    def boxes_between(self, t0: float, t1: float) -> List[Tuple[float, FaceBox]]:
+        """(t relative to t0, box or None) for every sample in [t0, t1), computing missing ones."""
+        self.ensure(t0, t1)
+        k0, k1 = self._span(t0, t1)
+        out: List[Tuple[float, FaceBox]] = []
+        for k in range(k0, k1):
+            b = self.boxes[k]
+            out.append((k / self.sample_fps - t0, tuple(int(v) for v in b) if b[2] > 0 else None))
+        return out
+
+    def centers(self, t0: float, t1: float, smooth: float = 0.8) -> List[Tuple[float, float, float]]:
+        """Smoothed face centers for a clip, ready for video_utils.crop_path_from_centers."""
+        return smooth_centers(self.boxes_between(t0, t1), self.info.width, self.info.height, smooth)
@@ -0,0 +1,413 @@
+import queue
+import re
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from encode_profiles import DEFAULT_TIER, ffmpeg_audio_args, ffmpeg_video_args
+from trace_utils import span
+from concurrency_utils import stage_slot
+
+VideoInfo = namedtuple('VideoInfo', 'width height fps duration has_audio')
+
+# One output of a fan-out render: crop_path is a face-track path ((t, x1, y1), t relative
+# to the clip start) or None for a center crop; size is the output (w, h), by default
+# the ratio's platform resolution for the tier, never above the crop size
+# (video_utils.plan_geometry); overlays are Overlay sprites at the crop size (title card,
+# watermark) blended into every frame before it is encoded.
+CropTarget = namedtuple('CropTarget', 'out_path ratio crop_path size overlays', defaults=(None, ()))
+
+# Frames in flight per queue; with the buffer pools this bounds memory to a few frames
+# per output regardless of clip length.
+QUEUE_FRAMES = 4
+
+_DIM_RE = re.compile(r'Stream #.*?Video:.*?(\d{2,5})x(\d{2,5})')
+_FPS_RE = re.compile(r'Stream #.*?Video:.*?([\d.]+) (?:fps|tbr)')
+_DUR_RE = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+
+
+def probe_video(path: str) -> VideoInfo:
+    """Size, frame rate, duration and audio presence parsed from `ffmpeg -i` (no ffprobe needed)."""
+    r = subprocess.run(['ffmpeg', '-hide_banner', '-i', path], capture_output=True, text=True)
+    err = r.stderr
+    dim = _DIM_RE.search(err)
+    if not dim:
+        raise ValueError(f"No video stream found in {path}")
+    fps = _FPS_RE.search(err)
+    dur = _DUR_RE.search(err)
+    duration = int(dur.group(1))*3600 + int(dur.group(2))*60 + float(dur.group(3)) if dur else 0.0
+    has_audio = re.search(r'Stream #.*?Audio:', err) is not None
+    return VideoInfo(int(dim.group(1)), int(dim.group(2)), float(fps.group(1)) if fps else 25.0, duration, has_audio)
+
+
+def _decode_cmd(path: str, t0: float, t1: float, rate: float) -> List[str]:
+    """ffmpeg command writing [t0, t1) of path to stdout as rgb24 frames at a constant rate."""
+    return ['ffmpeg', '-loglevel', 'error', '-ss', f'{t0:.3f}', '-t', f'{max(0.0, t1 - t0):.3f}', '-i', path, '-an',
+            '-vf', f'fps={rate}', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+
+
+def read_frames(path: str, t0: float, t1: float, fps: Optional[float] = None,
+                info: Optional[VideoInfo] = None) -> Iterator[Tuple[float, np.ndarray]]:
+    """Decode [t0, t1) as RGB frames; yields (t relative to t0, HxWx3 uint8).
+
+    fps resamples (e.g. 4 for face analysis); by default frames come at the probed
+    rate, with variable frame rate sources duplicated/dropped to a constant rate.
+    """
+    info = info or probe_video(path)
+    rate = fps or info.fps
+    cmd = _decode_cmd(path, t0, t1, rate)
+    frame_bytes = info.width * info.height * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        n = 0
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield n / rate, np.frombuffer(buf, np.uint8).reshape(info.height, info.width, 3)
+            n += 1
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+class BufferPool:
+    """Fixed set of preallocated frame buffers, handed out and returned through a queue.
+
+    get() blocks while every buffer is in use, which is what throttles a faster stage.
+    share()/release() let several consumers hold one buffer; it returns to the pool when
+    the last of them releases it.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], count: int):
+        self._free: 'queue.Queue[np.ndarray]' = queue.Queue()
+        for _ in range(count):
+            self._free.put(np.empty(shape, np.uint8))
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    def get(self, stop: Optional[threading.Event] = None) -> np.ndarray:
+        return _get(self._free, stop)
+
+    def put(self, buf: np.ndarray) -> None:
+        self._free.put(buf)
+
+    def share(self, buf: np.ndarray, users: int) -> None:
+        with self._lock:
+            self._refs[id(buf)] = users
+
+    def release(self, buf: np.ndarray) -> None:
+        with self._lock:
+            left = self._refs.pop(id(buf), 1) - 1
+            if left > 0:
+                self._refs[id(buf)] = left
+        if left <= 0:
+            self._free.put(buf)
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _get(q: 'queue.Queue', stop: Optional[threading.Event]):
+    """Blocking get that gives up once stop is set (so a failed stage cannot wedge the others)."""
+    while True:
+        if stop is not None and stop.is_set():
+            raise _Stopped()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def _put(q: 'queue.Queue', item, stop: Optional[threading.Event]) -> None:
+    while True:
+        if stop is not None and stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def read_frames_pooled(path: str, t0: float, t1: float, pool: BufferPool, info: VideoInfo,
+                       stop: Optional[threading.Event] = None) -> Iterator[Tuple[float, np.ndarray]]:
+    """Like read_frames, but each frame is read straight into a buffer taken from pool.
+
+    The caller owns the yielded buffer and must return it with pool.put()/release().
+    Raises RuntimeError if the decoder exits with an error, so a corrupt or truncated
+    source fails the render instead of producing a short clip.
+    """
+    cmd = _decode_cmd(path, t0, t1, info.fps)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        n = 0
+        while True:
+            buf = pool.get(stop)
+            view = memoryview(buf.reshape(-1))
+            got = 0
+            while got < len(view):
+                k = proc.stdout.readinto(view[got:])
+                if not k:
+                    break
+                got += k
+            if got < len(view):
+                pool.put(buf)
+                break
+            yield n / info.fps, buf
+            n += 1
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg decoder failed for {path} (exit code {proc.returncode})")
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+class FrameEncoder:
+    """ffmpeg process encoding raw RGB frames from stdin, muxing the source audio for [t0, t1).
+
+    out_size scales the frames in the encoder (one swscale pass in C); None keeps `size`.
+    The audio is padded with silence and the output cut at t1 - t0, so a source whose
+    audio ends early never closes the encoder before all frames are written.
+    """
+
+    def __init__(self, out_path: str, size: Tuple[int, int], fps: float, tier: str = DEFAULT_TIER,
+                 audio_src: Optional[str] = None, t0: float = 0.0, t1: Optional[float] = None,
+                 audio_gain_db: float = 0.0, out_size: Optional[Tuple[int, int]] = None):
+        w, h = size
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}', '-r', f'{fps}', '-i', '-']
+        if audio_src:
+            cmd += ['-ss', f'{t0:.3f}'] + (['-t', f'{t1 - t0:.3f}'] if t1 is not None else []) + ['-i', audio_src,
+                                                                                                 '-map', '0:v:0', '-map', '1:a:0?']
+        if out_size and tuple(out_size) != (w, h):
+            cmd += ['-vf', f'scale={out_size[0]}:{out_size[1]}:flags=bicubic']
+        cmd += ffmpeg_video_args(tier)
+        if audio_src:
+            afilter = 'apad'
+            if audio_gain_db:
+                # Loudness normalization; the limiter keeps boosted peaks below -1 dBFS.
+                afilter = f'volume={audio_gain_db:.2f}dB,alimiter=limit=0.891,' + afilter
+            cmd += ['-af', afilter] + ffmpeg_audio_args(tier)
+            cmd += ['-t', f'{t1 - t0:.3f}'] if t1 is not None else ['-shortest']
+        cmd += [out_path]
+        self.out_path = out_path
+        self.frames = 0
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame: np.ndarray) -> None:
+        self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        self.frames += 1
+
+    def close(self) -> str:
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoder failed for {self.out_path}")
+        return self.out_path
+
+    def abort(self) -> None:
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        self.proc.kill()
+        self.proc.wait()
+
+
+class Overlay:
+    """Static RGBA sprite alpha-blended at (x, y) into every frame of one output.
+
+    Only the sprite's non-transparent bounding box is kept, and the premultiplied colour
+    and inverse alpha are computed once, so each frame costs one small integer blend.
+    """
+
+    def __init__(self, rgba: np.ndarray, x: int = 0, y: int = 0):
+        ys, xs = np.nonzero(rgba[..., 3])
+        if len(ys):
+            y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        else:
+            y0 = y1 = x0 = x1 = 0
+        rgba = rgba[y0:y1, x0:x1]
+        self.x, self.y = x + int(x0), y + int(y0)
+        self.h, self.w = rgba.shape[:2]
+        alpha = rgba[..., 3:4].astype(np.uint16)
+        # (frame * (255 - a) + rgb * a) / 255, rounded; never above 65025, so uint16 holds it.
+        self.pre = rgba[..., :3].astype(np.uint16) * alpha + 127
+        self.inv = 255 - alpha
+
+    def apply(self, frame: np.ndarray) -> None:
+        if not self.w:
+            return
+        region = frame[self.y:self.y + self.h, self.x:self.x + self.w]
+        np.copyto(region, (region * self.inv + self.pre) // 255, casting='unsafe')
+
+
+def crop_origin_fn(path: Optional[Sequence[Tuple[float, int, int]]], default: Tuple[int, int]) -> Callable[[float], Tuple[int, int]]:
+    """t -> (x1, y1): linear interpolation along a crop path, or a fixed (center) origin."""
+    if not path:
+        return lambda t: default
+    ts = np.array([p[0] for p in path], dtype=float)
+    xs = np.array([p[1] for p in path], dtype=float)
+    ys = np.array([p[2] for p in path], dtype=float)
+    return lambda t: (int(round(np.interp(t, ts, xs))), int(round(np.interp(t, ts, ys))))
+
+
+class _CropStage:
+    """Transform and encode threads for one output of render_crops.
+
+    Source frames arrive on inbox; the transform thread copies the crop into a buffer
+    from this output's pool and queues it for the writer thread, which feeds the
+    encoder's stdin. Both queues are bounded, so a slow encoder backs up to the decoder.
+    Overlays are blended into the cropped copy there too, so titles and watermarks cost
+    no extra encode. A crop window covering the whole frame, with no overlays, is passed
+    through without a copy.
+    """
+
+    def __init__(self, encoder: 'FrameEncoder', size: Tuple[int, int], origin: Callable[[float], Tuple[int, int]],
+                 info: VideoInfo, src_pool: BufferPool, stop: threading.Event, depth: int = QUEUE_FRAMES,
+                 overlays: Sequence[Overlay] = ()):
+        self.encoder = encoder
+        self.cw, self.ch = size
+        self.origin = origin
+        self.info = info
+        self.src_pool = src_pool
+        self.stop = stop
+        self.overlays = list(overlays)
+        for ov in self.overlays:
+            if ov.x < 0 or ov.y < 0 or ov.x + ov.w > self.cw or ov.y + ov.h > self.ch:
+                raise ValueError(f"Overlay {ov.w}x{ov.h} at ({ov.x}, {ov.y}) does not fit a {self.cw}x{self.ch} crop")
+        self.full_frame = (self.cw, self.ch) == (info.width, info.height) and not self.overlays
+        self.pool = None if self.full_frame else BufferPool((self.ch, self.cw, 3), depth + 2)
+        self.inbox: 'queue.Queue' = queue.Queue(depth)
+        self.outbox: 'queue.Queue' = queue.Queue(depth)
+        self.error: Optional[BaseException] = None
+        self.crop_s = 0.0
+        self.write_s = 0.0
+        self.threads = [threading.Thread(target=self._guard, args=(fn,), daemon=True)
+                        for fn in (self._transform, self._write)]
+        for th in self.threads:
+            th.start()
+
+    def _guard(self, fn: Callable[[], None]) -> None:
+        try:
+            fn()
+        except _Stopped:
+            pass
+        except BaseException as ex:
+            self.error = ex
+            self.stop.set()
+
+    def _transform(self) -> None:
+        while True:
+            item = _get(self.inbox, self.stop)
+            if item is None:
+                _put(self.outbox, None, self.stop)
+                return
+            t, frame = item
+            if self.full_frame:
+                _put(self.outbox, (frame, self.src_pool), self.stop)
+                continue
+            out = self.pool.get(self.stop)
+            c0 = time.perf_counter()
+            x, y = self.origin(t)
+            x = max(0, min(self.info.width - self.cw, x))
+            y = max(0, min(self.info.height - self.ch, y))
+            np.copyto(out, frame[y:y + self.ch, x:x + self.cw])
+            for ov in self.overlays:
+                ov.apply(out)
+            self.crop_s += time.perf_counter() - c0
+            self.src_pool.release(frame)
+            _put(self.outbox, (out, self.pool), self.stop)
+
+    def _write(self) -> None:
+        while True:
+            item = _get(self.outbox, self.stop)
+            if item is None:
+                return
+            buf, pool = item
+            w0 = time.perf_counter()
+            self.encoder.write(buf)
+            self.write_s += time.perf_counter() - w0
+            pool.release(buf)
+
+    def submit(self, t: float, frame: np.ndarray) -> None:
+        _put(self.inbox, (t, frame), self.stop)
+
+    def finish(self) -> None:
+        _put(self.inbox, None, self.stop)
+        self.join()
+
+    def join(self) -> None:
+        for th in self.threads:
+            th.join()
+
+
+def render_crops(src: str, t0: float, t1: float, targets: List[CropTarget], tier: str = DEFAULT_TIER,
+                 info: Optional[VideoInfo] = None, audio_gain_db: float = 0.0, depth: int = QUEUE_FRAMES) -> List[str]:
+    """Decode [t0, t1) of src once and encode every target crop with its own ffmpeg encoder.
+
+    Decode (this thread), crop (one thread per output) and encoder writes (one thread
+    per output) overlap; bounded queues and fixed buffer pools keep at most a few
+    frames per stage in memory. Each output frame is one crop copy (with the target's
+    overlays blended in) plus one scale to the target size in the encoder, and nothing
+    at all where the geometry is an identity and there are no overlays. Per-output
+    geometry and per-frame crop/encode cost go into the span. audio_gain_db is applied
+    to every output's audio.
+    """
+    from video_utils import plan_geometry
+
+    if not targets:
+        return []
+    info = info or probe_video(src)
+    plans = []
+    for tgt in targets:
+        geo = plan_geometry(info.width, info.height, tgt.ratio, tier, tgt.size)
+        x, y = (info.width - geo.crop_w) // 2, (info.height - geo.crop_h) // 2
+        plans.append((geo, crop_origin_fn(tgt.crop_path, (x, y))))
+    encoders: List[FrameEncoder] = []
+    stages: List[_CropStage] = []
+    stop = threading.Event()
+    src_pool = BufferPool((info.height, info.width, 3), depth + 2)
+    with stage_slot('cpu'), span('render_crops', tier=tier, outputs=len(targets),
+                                 geometry=[str(geo) for geo, _ in plans]) as sp:
+        try:
+            for tgt, (geo, origin) in zip(targets, plans):
+                encoders.append(FrameEncoder(tgt.out_path, (geo.crop_w, geo.crop_h), info.fps, tier,
+                                             src if info.has_audio else None, t0, t1, audio_gain_db,
+                                             out_size=(geo.out_w, geo.out_h)))
+                stages.append(_CropStage(encoders[-1], (geo.crop_w, geo.crop_h), origin, info, src_pool, stop, depth,
+                                         tgt.overlays))
+            try:
+                for t, frame in read_frames_pooled(src, t0, t1, src_pool, info, stop):
+                    sp.frames += 1
+                    src_pool.share(frame, len(stages))
+                    for st in stages:
+                        st.submit(t, frame)
+                for st in stages:
+                    st.finish()
+            except _Stopped:
+                pass
+            errors = [st.error for st in stages if st.error is not None]
+            if errors:
+                raise errors[0]
+            out = [enc.close() for enc in encoders]
+        except BaseException:
+            stop.set()
+            for st in stages:
+                st.join()
+            for enc in encoders:
+                enc.abort()
+            raise
+        n = max(1, sp.frames)
+        sp.attrs['crop_us_per_frame'] = [round(st.crop_s / n * 1e6, 1) for st in stages]
+        sp.attrs['encode_us_per_frame'] = [round(st.write_s / n * 1e6, 1) for st in stages]
+        for p in out:
+            sp.add_file_io(written_path=p)
+    return out
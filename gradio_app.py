@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Gradio web interface for the AI Shorts Generator (local/Colab).
+
+Generate and promote requests are submitted to an in-process job_server.JobServer
+instead of running the pipeline inside the Gradio handler, so several users' jobs
+queue and run side by side (bounded by the server's workers and cpu/io slots) and
+each handler only streams its job's progress events and result ZIP.
+"""
+
+import os
+from typing import Dict, Iterator, Optional, Tuple
+
+import gradio as gr
+
+from encode_profiles import ENCODE_PROFILES
+from job_server import JobServer
+
+
+def _upload_path(f) -> Optional[str]:
+    """Path of a gr.File value (a path string, or a tempfile wrapper in older Gradio)."""
+    return getattr(f, 'name', f) or None
+
+
+def job_logs(jobs: JobServer, job_id: str) -> Iterator[Tuple[str, Dict]]:
+    """(log text so far, job record) after each batch of the job's events; the last one is the finished job."""
+    lines = []
+    for evs in jobs.follow(job_id):
+        lines += [e['message'] for e in evs if e['message'] and e['stage'] != 'file']
+        yield '\n'.join(lines), jobs.store.get(job_id)
+    yield '\n'.join(lines), jobs.store.get(job_id)
+
+
+def create_gradio_interface(jobs: Optional[JobServer] = None):
+    """Create Gradio web interface; jobs defaults to a started JobServer in ./jobs"""
+    jobs = jobs or JobServer('jobs').start()
+
+    def run_gradio_ui(youtube_url, video_file, srt_file, provider, openai_key, gemini_key,
+                      target_len, tol, max_clips, aspect, crop_mode, karaoke, export_srt,
+                      title_mode, custom_title, platform, out_prefix, watermark_file, seo_text, tier):
+        """Gradio interface handler: submit a job and stream its logs, then the ZIP and render plan"""
+        params = {
+            'youtube_url': youtube_url or None, 'video_file': _upload_path(video_file),
+            'srt_file': _upload_path(srt_file), 'watermark_file': _upload_path(watermark_file),
+            'provider': provider, 'openai_key': openai_key, 'gemini_key': gemini_key,
+            'min_len': max(5, int(target_len) - int(tol)), 'max_len': int(target_len) + int(tol),
+            'max_clips': int(max_clips), 'aspect': aspect, 'crop_mode': crop_mode, 'karaoke': bool(karaoke),
+            'export_srt': bool(export_srt), 'title_mode': title_mode, 'custom_title': custom_title,
+            'platform': platform, 'out_prefix': out_prefix or 'short', 'seo_text': seo_text, 'tier': tier,
+        }
+        try:
+            job_id = jobs.submit(params)
+        except ValueError as ex:
+            yield None, f'Error: {ex}', ''
+            return
+        for text, job in job_logs(jobs, job_id):
+            yield None, text, ''
+        plan_path = os.path.join(jobs.job_dir(job_id), os.path.basename(params['out_prefix']) + '_plan.json')
+        yield (job['result'] if job['status'] == 'done' else None, text,
+               plan_path if tier == 'preview' and os.path.exists(plan_path) else '')
+
+    def run_promote(plan_path, approved):
+        """Render approved preview clips at the final tier (as a promotion job)"""
+        if not plan_path:
+            yield None, 'Run a preview first.'
+            return
+        try:
+            picked = [int(x) for x in str(approved or '').split(',') if x.strip()]
+            job_id = jobs.submit({'promote_plan': plan_path, 'approve': picked})
+        except ValueError as ex:
+            yield None, f'Error: {ex}'
+            return
+        for text, job in job_logs(jobs, job_id):
+            yield None, text
+        yield job['result'] if job['status'] == 'done' else None, text
+
+    with gr.Blocks(title="AI Shorts Generator") as demo:
+        gr.Markdown("# 🎬 AI Shorts Generator")
+        gr.Markdown("Render quick previews, approve the clips you like, then promote them to full quality.")
+
+        plan_state = gr.State('')
+
+        with gr.Row():
+            with gr.Column(scale=1):
+                youtube_url = gr.Textbox(label='YouTube URL (optional)', placeholder='https://www.youtube.com/watch?v=...')
+                video_file = gr.File(label='Or upload a video file', file_types=['video'])
+                srt_file = gr.File(label='Upload SRT subtitles (optional)', file_types=['.srt'])
+
+                provider = gr.Dropdown(['OpenAI','Gemini'], label='AI Provider', value='OpenAI')
+                openai_key = gr.Textbox(label='OpenAI API Key', type='password', visible=True,
+                                        placeholder='sk-...')
+                gemini_key = gr.Textbox(label='Gemini API Key', type='password', visible=False,
+                                        placeholder='your-gemini-key')
+
+                with gr.Row():
+                    target_len = gr.Slider(10, 120, value=60, step=1, label='Target short length (s)')
+                    tol = gr.Slider(2, 30, value=10, step=1, label='Length tolerance ± (s)')
+                max_clips = gr.Slider(1, 10, value=3, step=1, label='Maximum number of clips')
+
+                aspect = gr.Dropdown(['9:16','16:9','1:1'], value=['9:16'], multiselect=True, label='Aspect ratio(s)')
+                crop_mode = gr.Dropdown(['Center','Face-track'], value='Face-track', label='Crop mode')
+
+                with gr.Row():
+                    karaoke = gr.Checkbox(label='Burn karaoke subtitles', value=True)
+                    export_srt = gr.Checkbox(label='Export SRT files', value=True)
+
+                title_mode = gr.Dropdown(['Auto','Custom','None'], value='Auto', label='Title overlay mode')
+                custom_title = gr.Textbox(label='Custom title (if Custom mode)',
+                                          placeholder='Enter your custom title...')
+                platform = gr.Dropdown(['TikTok','YouTube','Instagram'], value='TikTok', label='Platform')
+
+                out_prefix = gr.Textbox(label='Output name prefix', value='short')
+                watermark_file = gr.File(label='Watermark image (optional)', file_types=['image'])
+                seo_text = gr.Textbox(label='SEO description (optional)', lines=3,
+                                      placeholder='Enter description for your clips...')
+                tier = gr.Dropdown(list(ENCODE_PROFILES), value='preview', label='Render tier')
+
+                go = gr.Button('🚀 Generate Shorts', variant='primary')
+
+            with gr.Column(scale=1):
+                logs = gr.Textbox(label='Process logs', lines=20, interactive=False)
+                out_zip = gr.File(label='📦 Download Results ZIP')
+
+                approved = gr.Textbox(label='Approved clip numbers (e.g. 1,3; empty = all)')
+                promote = gr.Button('✅ Promote approved clips to final')
+                final_logs = gr.Textbox(label='Promotion logs', lines=8, interactive=False)
+                final_zip = gr.File(label='📦 Download Final ZIP')
+
+        def toggle_provider(p):
+            return (gr.update(visible=p=='OpenAI'), gr.update(visible=p=='Gemini'))
+
+        provider.change(toggle_provider, provider, [openai_key, gemini_key])
+        go.click(run_gradio_ui,
+                 [youtube_url, video_file, srt_file, provider, openai_key, gemini_key,
+                  target_len, tol, max_clips, aspect, crop_mode, karaoke, export_srt,
+                  title_mode, custom_title, platform, out_prefix, watermark_file, seo_text, tier],
+                 [out_zip, logs, plan_state], concurrency_limit=None)
+        # The handlers only wait on their job's events; the JobServer bounds the renders,
+        # so no handler needs to hold Gradio's (default single) concurrency slot.
+        promote.click(run_promote, [plan_state, approved], [final_zip, final_logs], concurrency_limit=None)
+
+    return demo
+
+
+if __name__ == "__main__":
+    create_gradio_interface().launch()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Local job service for the AI Shorts Generator.
+
+Jobs are stored in a SQLite queue under --jobs-dir (so queued work survives a
+restart) and run by a bounded pool of worker threads. Render stages (encodes,
+karaoke burns, face tracking, transcription) and I/O stages (downloads, LLM
+calls) have separate concurrency limits, so one job's renders don't stop
+another job from downloading or talking to the LLM.
+
+HTTP API (JSON):
+    POST   /jobs                 submit; body = generate_pipeline options (or promote_plan and
+                                 approve to promote preview clips), returns {"id": ...}
+    GET    /jobs                 list jobs
+    GET    /jobs/<id>            job status
+    DELETE /jobs/<id>            cancel a queued job
+    GET    /jobs/<id>/events     progress events (?after=<seq>&wait=<seconds> to long-poll)
+    GET    /jobs/<id>/stream     progress events as Server-Sent Events until the job ends
+    GET    /jobs/<id>/result     the results ZIP; while the job runs it is streamed, each clip
+                                 sent as soon as it is finished
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from concurrency_utils import set_stage_limits
+from encode_profiles import DEFAULT_TIER
+from package_utils import send_zip_stream, stream_zip
+
+TERMINAL = ('done', 'failed', 'cancelled')
+
+# Options accepted by POST /jobs, with the same defaults as run_pipeline.py.
+DEFAULT_PARAMS = {
+    'youtube_url': None, 'video_file': None, 'srt_file': None, 'watermark_file': None,
+    'provider': 'OpenAI', 'openai_key': '', 'gemini_key': '',
+    'min_len': 15, 'max_len': 60, 'max_clips': 5, 'aspect': '9:16', 'crop_mode': 'Center',
+    'karaoke': False, 'export_srt': False, 'title_mode': 'Auto', 'custom_title': '', 'platform': 'TikTok',
+    'out_prefix': 'short', 'seo_text': '', 'tier': DEFAULT_TIER, 'partial_download': False,
+    # A promotion job: re-render the approved clips (all if empty) of a preview's render plan.
+    'promote_plan': None, 'approve': None,
+}
+PATH_PARAMS = ('video_file', 'srt_file', 'watermark_file', 'promote_plan')
+# Never written to jobs.db; held in memory by the JobServer that accepted the job and
+# otherwise taken from OPENAI_API_KEY / GEMINI_API_KEY at run time.
+SECRET_PARAMS = ('openai_key', 'gemini_key')
+
+
+class JobStore:
+    """SQLite-backed job queue and progress event log."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL,
+                    created REAL NOT NULL, started REAL, finished REAL, result TEXT, error TEXT);
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL, seq INTEGER NOT NULL, time REAL NOT NULL,
+                    stage TEXT NOT NULL, message TEXT, data TEXT, PRIMARY KEY (job_id, seq));
+            """)
+
+    def _job(self, row) -> Dict:
+        d = dict(row)
+        d['params'] = json.loads(d['params'])
+        return d
+
+    def submit(self, params: Dict) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        stored = {k: v for k, v in params.items() if k not in SECRET_PARAMS}
+        with self._lock, self._db:
+            self._db.execute('INSERT INTO jobs (id, status, params, created) VALUES (?, ?, ?, ?)',
+                             (job_id, 'queued', json.dumps(stored), time.time()))
+        self.add_event(job_id, 'queued', 'Job queued')
+        return job_id
+
+    def claim(self) -> Optional[Dict]:
+        """Mark the oldest queued job as running and return it."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row['id']))
+        return self.get(row['id'])
+
+    def finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock, self._db:
+            self._db.execute('UPDATE jobs SET status = ?, finished = ?, result = ?, error = ? WHERE id = ?',
+                             (status, time.time(), result, error, job_id))
+            self._cond.notify_all()
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock, self._db:
+            cur = self._db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                                   (time.time(), job_id))
+        if cur.rowcount:
+            self.add_event(job_id, 'cancelled', 'Job cancelled')
+        return bool(cur.rowcount)
+
+    def recover(self) -> List[str]:
+        """Re-queue jobs left 'running' by a previous process."""
+        with self._lock, self._db:
+            ids = [r['id'] for r in self._db.execute("SELECT id FROM jobs WHERE status = 'running'")]
+            self._db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+        for job_id in ids:
+            self.add_event(job_id, 'requeued', 'Job interrupted by a restart; queued again')
+        return ids
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM jobs ORDER BY created').fetchall()
+        return [self._job(r) for r in rows]
+
+    def add_event(self, job_id: str, stage: str, message: str = '', **data) -> int:
+        with self._lock, self._db:
+            seq = self._db.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE job_id = ?', (job_id,)).fetchone()[0]
+            self._db.execute('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)',
+                             (job_id, seq, time.time(), stage, message, json.dumps(data, default=str)))
+            self._cond.notify_all()
+        return seq
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute('SELECT seq, time, stage, message, data FROM events WHERE job_id = ? AND seq > ? '
+                                    'ORDER BY seq', (job_id, after)).fetchall()
+        return [dict(r, data=json.loads(r['data'] or '{}')) for r in rows]
+
+    def wait_events(self, job_id: str, after: int = 0, timeout: float = 15.0) -> List[Dict]:
+        """Block until there are events after `after`, the job has ended, or timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                evs = self.events(job_id, after)
+                job = self.get(job_id)
+                remaining = deadline - time.time()
+                if evs or job is None or job['status'] in TERMINAL or remaining <= 0:
+                    return evs
+                self._cond.wait(remaining)
+
+
+class JobEvents:
+    """Pipeline logger that records structured progress events for one job.
+
+    Called with a message (the plain logger interface) it records a 'log' event;
+    pipeline_advanced._progress calls event() with a stage name and data instead.
+    file() is the pipeline's on_file callback: each finished file becomes a 'file'
+    event, which is what /jobs/<id>/result streams from.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, message) -> None:
+        self.store.add_event(self.job_id, 'log', str(message))
+
+    def event(self, stage: str, message: str = '', **data) -> None:
+        self.store.add_event(self.job_id, stage, message, **data)
+
+    def file(self, entry) -> None:
+        path, arcname = entry if isinstance(entry, tuple) else (entry, os.path.basename(entry))
+        self.store.add_event(self.job_id, 'file', arcname, path=path, arcname=arcname)
+
+
+def normalize_params(params: Dict) -> Dict:
+    """Validate a job submission and fill in defaults; raises ValueError."""
+    unknown = sorted(set(params) - set(DEFAULT_PARAMS))
+    if unknown:
+        raise ValueError(f"Unknown option(s): {', '.join(unknown)}")
+    out = dict(DEFAULT_PARAMS, **params)
+    if not out['youtube_url'] and not out['video_file'] and not out['promote_plan']:
+        raise ValueError('youtube_url, video_file or promote_plan is required')
+    for k in PATH_PARAMS:
+        if out[k] and not os.path.exists(out[k]):
+            raise ValueError(f"{k} not found: {out[k]}")
+    return out
+
+
+def run_job(params: Dict, out_prefix: str, logger: Callable) -> Optional[str]:
+    """Default job runner: generate_pipeline with file paths wrapped like Gradio uploads.
+
+    Promotion jobs run promote_clips instead; their ZIP is written next to the plan.
+    """
+    from pipeline_advanced import generate_pipeline, promote_clips
+
+    kw = dict(DEFAULT_PARAMS, **params)
+    plan, approve = kw.pop('promote_plan'), kw.pop('approve')
+    if plan:
+        return promote_clips(plan, [int(a) for a in approve or []] or None, logger=logger,
+                             on_file=getattr(logger, 'file', None))
+    for k in PATH_PARAMS:
+        kw[k] = SimpleNamespace(name=kw[k]) if kw[k] else None
+    kw['openai_key'] = kw['openai_key'] or os.getenv('OPENAI_API_KEY', '')
+    kw['gemini_key'] = kw['gemini_key'] or os.getenv('GEMINI_API_KEY', '')
+    kw['out_prefix'] = out_prefix
+    return generate_pipeline(logger=logger, on_file=getattr(logger, 'file', None), **kw)
+
+
+class JobServer:
+    """Worker pool that drains the JobStore queue."""
+
+    def __init__(self, jobs_dir: str = 'jobs', workers: int = 2, cpu_slots: Optional[int] = 1,
+                 io_slots: Optional[int] = 4, runner: Callable = run_job):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.cpu_slots = cpu_slots
+        self.io_slots = io_slots
+        self.runner = runner
+        self.store = JobStore(os.path.join(jobs_dir, 'jobs.db'))
+        self._secrets: Dict[str, Dict[str, str]] = {}
+        self._secrets_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> 'JobServer':
+        set_stage_limits(cpu=self.cpu_slots, io=self.io_slots)
+        self.store.recover()
+        for n in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f'job-worker-{n}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def submit(self, params: Dict) -> str:
+        params = normalize_params(params)
+        secrets = {k: params[k] for k in SECRET_PARAMS if params.get(k)}
+        with self._secrets_lock:
+            job_id = self.store.submit(params)
+            if secrets:
+                self._secrets[job_id] = secrets
+        self._wake.set()
+        return job_id
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def follow(self, job_id: str, poll: float = 15.0) -> Iterator[List[Dict]]:
+        """Yield each new batch of a job's events until it ends (for in-process clients such as the Gradio UI)."""
+        after = 0
+        while True:
+            evs = self.store.wait_events(job_id, after, poll)
+            if evs:
+                after = evs[-1]['seq']
+                yield evs
+                continue
+            job = self.store.get(job_id)
+            if job is None or job['status'] in TERMINAL:
+                return
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            job = self.store.claim()
+            if job is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict) -> None:
+        job_id = job['id']
+        work = self.job_dir(job_id)
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(work)
+        events = JobEvents(self.store, job_id)
+        events.event('started', 'Job started', worker=threading.current_thread().name)
+        try:
+            prefix = os.path.join(work, os.path.basename(job['params'].get('out_prefix') or 'short'))
+            with self._secrets_lock:
+                secrets = self._secrets.pop(job_id, {})
+            params = dict(job['params'], **secrets)
+            zip_path = self.runner(params, prefix, events)
+        except Exception as ex:
+            events.event('failed', f"Job failed: {ex}", error=str(ex))
+            self.store.finish(job_id, 'failed', error=str(ex))
+            return
+        if zip_path and os.path.exists(zip_path):
+            events.event('done', f"Results ready -> {zip_path}", result=zip_path)
+            self.store.finish(job_id, 'done', result=zip_path)
+        else:
+            last = [e['message'] for e in self.store.events(job_id) if e['stage'] in ('error', 'log')]
+            error = last[-1] if last else 'Pipeline did not produce results'
+            events.event('failed', error, error=error)
+            self.store.finish(job_id, 'failed', error=error)
+
+
+def _public(job: Dict) -> Dict:
+    """Job record for API responses (API keys are not echoed back)."""
+    params = {k: v for k, v in job['params'].items() if not k.endswith('_key')}
+    return dict(job, params=params, result=bool(job.get('result')) and job['status'] == 'done')
+
+
+class JobHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ShortsJobServer/1.0'
+    jobs: JobServer = None  # set by make_http_server
+
+    def _send_json(self, obj, status: int = 200) -> None:
+        body = json.dumps(obj, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ['jobs']:
+            return self._send_json({'error': 'not found'}, 404)
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length) or b'{}')
+            job_id = self.jobs.submit(params)
+        except (ValueError, TypeError) as ex:
+            return self._send_json({'error': str(ex)}, 400)
+        self._send_json({'id': job_id, 'status': 'queued'}, 201)
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self._send_json({'error': 'not found'}, 404)
+        if self.jobs.store.get(parts[1]) is None:
+            return self._send_json({'error': 'not found'}, 404)
+        if not self.jobs.store.cancel(parts[1]):
+            return self._send_json({'error': 'only queued jobs can be cancelled'}, 409)
+        self._send_json({'id': parts[1], 'status': 'cancelled'})
+
+    def do_GET(self):
+        parts, query = self._route()
+        store = self.jobs.store
+        if parts == ['jobs']:
+            return self._send_json([_public(j) for j in store.list()])
+        if len(parts) < 2 or parts[0] != 'jobs' or len(parts) > 3:
+            return self._send_json({'error': 'not found'}, 404)
+        job = store.get(parts[1])
+        if job is None:
+            return self._send_json({'error': 'not found'}, 404)
+        action = parts[2] if len(parts) == 3 else ''
+        try:
+            after = int(query.get('after', 0))
+            wait = float(query.get('wait', 0))
+            if after < 0 or not 0 <= wait < float('inf'):
+                raise ValueError
+        except ValueError:
+            return self._send_json({'error': 'after must be a non-negative integer and wait a number of seconds'}, 400)
+        if action == '':
+            return self._send_json(_public(job))
+        if action == 'events':
+            evs = store.wait_events(job['id'], after, min(wait, 60)) if wait else store.events(job['id'], after)
+            return self._send_json({'status': store.get(job['id'])['status'], 'events': evs})
+        if action == 'stream':
+            return self._stream(job['id'], after)
+        if action == 'result':
+            return self._send_result(job)
+        self._send_json({'error': 'not found'}, 404)
+
+    def _stream(self, job_id: str, after: int) -> None:
+        store = self.jobs.store
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+        while True:
+            evs = store.wait_events(job_id, after, 15.0)
+            out = ''.join(f"id: {e['seq']}\nevent: {e['stage']}\ndata: {json.dumps(e, default=str)}\n\n" for e in evs)
+            self.wfile.write(out.encode() if out else b': keep-alive\n\n')
+            self.wfile.flush()
+            if evs:
+                after = evs[-1]['seq']
+            elif store.get(job_id)['status'] in TERMINAL:
+                return
+
+    def _job_files(self, job_id: str) -> Iterator[Tuple[str, str]]:
+        """(path, arcname) of each file the job delivers, blocking until the next one or the job's end."""
+        store = self.jobs.store
+        after = 0
+        while True:
+            evs = store.wait_events(job_id, after, 15.0)
+            for e in evs:
+                after = e['seq']
+                if e['stage'] == 'file':
+                    yield e['data']['path'], e['data']['arcname']
+            if not evs and store.get(job_id)['status'] in TERMINAL:
+                return
+
+    def _send_result(self, job: Dict) -> None:
+        if job['status'] in ('queued', 'running'):
+            # Stream the archive as the clips finish instead of waiting for the last one.
+            name = os.path.basename(job['params'].get('out_prefix') or 'short') + '_results.zip'
+            return send_zip_stream(self, stream_zip(self._job_files(job['id'])), name)
+        if job['status'] != 'done':
+            return self._send_json({'error': f"job is {job['status']}"}, 409)
+        path = job['result']
+        if not path or not os.path.exists(path):
+            return self._send_json({'error': 'result file missing'}, 410)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_http_server(jobs: JobServer, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    handler = type('BoundJobHandler', (JobHandler,), {'jobs': jobs})
+    srv = ThreadingHTTPServer((host, port), handler)
+    srv.daemon_threads = True
+    return srv
+
+
+def main():
+    p = argparse.ArgumentParser(description='AI Shorts Generator - local job server')
+    p.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    p.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    p.add_argument('--jobs-dir', default='jobs', help='Job database and per-job output directory')
+    p.add_argument('--workers', type=int, default=2, help='Jobs that may run at the same time')
+    p.add_argument('--cpu-slots', type=int, default=1,
+                   help='Concurrent render stages (encodes, karaoke burns, face tracking, transcription)')
+    p.add_argument('--io-slots', type=int, default=4, help='Concurrent download/LLM stages')
+    args = p.parse_args()
+
+    jobs = JobServer(args.jobs_dir, args.workers, args.cpu_slots, args.io_slots).start()
+    srv = make_http_server(jobs, args.host, args.port)
+    print(f"Job server listening on http://{args.host}:{srv.server_address[1]} "
+          f"({args.workers} workers, {args.cpu_slots} cpu / {args.io_slots} io slots)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+        jobs.stop(timeout=5)
+
+
+if __name__ == '__main__':
+    main()
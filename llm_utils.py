@@ -1,39 +1,55 @@
 import json
-from typing import List, Dict
-import google.generativeai as genai
+from typing import Callable, List, Dict, Optional
 
-try:
-    from openai import OpenAI as _OpenAI
-    _OPENAI_NEW=True
-except Exception:
-    import openai as _openai_legacy
-    _OPENAI_NEW=False
+from trace_utils import traced
+from concurrency_utils import limited
 
+# The OpenAI and Gemini SDKs are imported on first use, so only the chosen provider's
+# SDK is ever loaded.
 
-def pick_highlights(transcription: str, provider: str, api_key: str, max_clips: int, min_len: int, max_len: int) -> List[Dict]:
+
+# Extra providers by name: fn(prompt, system, api_key, temperature) -> response text.
+# OpenAI and Gemini are built in; anything else (e.g. a mock for benchmarks) is registered here.
+PROVIDERS: Dict[str, Callable[[str, str, str, float], str]] = {}
+
+
+def register_provider(name: str, fn: Callable[[str, str, str, float], str]) -> None:
+    PROVIDERS[name] = fn
+
+
+def _complete(provider: str, api_key: str, prompt: str, system: str = '', temperature: float = 0.5) -> str:
+    if provider in PROVIDERS:
+        return PROVIDERS[provider](prompt, system, api_key, temperature)
+    if provider == 'OpenAI':
+        messages = ([{'role':'system','content':system}] if system else []) + [{'role':'user','content':prompt}]
+        try:
+            from openai import OpenAI as _OpenAI
+        except Exception:
+            import openai as _openai_legacy
+            _openai_legacy.api_key = api_key
+            r = _openai_legacy.ChatCompletion.create(model='gpt-4o-2024-05-13', temperature=temperature, messages=messages)
+        else:
+            client = _OpenAI(api_key=api_key)
+            r = client.chat.completions.create(model='gpt-4o-mini', temperature=temperature, messages=messages)
+        return r.choices[0].message.content
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    m = genai.GenerativeModel('gemini-2.5-flash')
+    return m.generate_content((system + '\n\n' + prompt) if system else prompt).text
+
+
+@traced('pick_highlights')
+@limited('io')
+def pick_highlights(transcription: str, provider: str, api_key: str, max_clips: int, min_len: int, max_len: int,
+                    audio_peaks: Optional[List[float]] = None) -> List[Dict]:
     sys = (
         f"You are an expert at finding viral video moments. Return up to {max_clips} segments between {min_len} and {max_len} seconds "
         "as JSON array with keys start,end,content. Only return JSON. If none, return []."
     )
-    if provider == 'OpenAI':
-        if _OPENAI_NEW:
-            client = _OpenAI(api_key=api_key)
-            r = client.chat.completions.create(
-                model='gpt-4o-mini', temperature=0.5,
-                messages=[{'role':'system','content':sys},{'role':'user','content':transcription}]
-            )
-            txt = r.choices[0].message.content
-        else:
-            _openai_legacy.api_key = api_key
-            r = _openai_legacy.ChatCompletion.create(
-                model='gpt-4o-2024-05-13', temperature=0.5,
-                messages=[{'role':'system','content':sys},{'role':'user','content':transcription}]
-            )
-            txt = r.choices[0].message.content
-    else:
-        genai.configure(api_key=api_key)
-        m = genai.GenerativeModel('gemini-2.5-flash')
-        txt = m.generate_content(sys + '\n\n' + transcription).text
+    if audio_peaks:
+        sys += (" Loudness spikes (laughter, applause, raised voices) occur at these seconds: "
+                + ', '.join(f"{t:.1f}" for t in audio_peaks) + ". Prefer segments that contain them.")
+    txt = _complete(provider, api_key, transcription, system=sys, temperature=0.5)
     txt = (txt or '').strip().replace('```','').replace('json','').strip()
     try:
         arr = json.loads(txt) if txt else []
@@ -43,32 +59,23 @@ def pick_highlights(transcription: str, provider: str, api_key: str, max_clips:
     for h in arr:
         try:
             s = float(h.get('start', 0)); e = float(h.get('end', 0))
-            if e > s and min_len <= e - s <= max_len:
+            # Lengths outside [min_len, max_len] are fitted by boundary_utils.refine_highlights.
+            if e > s >= 0:
                 out.append({'start': s, 'end': e, 'content': h.get('content','')})
         except Exception:
             continue
     return out
 
 
+@traced('generate_titles_from_highlights')
+@limited('io')
 def generate_titles_from_highlights(highs: List[Dict], provider: str, api_key: str) -> List[str]:
     if not highs:
         return []
     prompt = 'Create ultra-short (<=40 chars), high-energy titles with emojis for these clip summaries. Return JSON array of strings only.\n' + \
              json.dumps([h.get('content','') for h in highs])
     try:
-        if provider == 'OpenAI':
-            if _OPENAI_NEW:
-                client = _OpenAI(api_key=api_key)
-                r = client.chat.completions.create(model='gpt-4o-mini', temperature=0.7, messages=[{'role':'user','content':prompt}])
-                txt = r.choices[0].message.content
-            else:
-                _openai_legacy.api_key = api_key
-                r = _openai_legacy.ChatCompletion.create(model='gpt-4o-2024-05-13', temperature=0.7, messages=[{'role':'user','content':prompt}])
-                txt = r.choices[0].message.content
-        else:
-            genai.configure(api_key=api_key)
-            m = genai.GenerativeModel('gemini-2.5-flash')
-            txt = m.generate_content(prompt).text
+        txt = _complete(provider, api_key, prompt, temperature=0.7)
         txt = (txt or '').strip().replace('```','').replace('json','').strip()
         arr = json.loads(txt) if txt else []
         return [str(a)[:60] for a in arr]
@@ -0,0 +1,119 @@
+"""
+Synthetic media shared by the benchmark and the tests.
+
+ffmpeg testsrc video with a moving drawn face, speech-like tone audio and a
+synthetic SRT, generated once per size and reused. Importing this module is
+cheap; OpenCV is only loaded to draw the face the first time a video is made.
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+from typing import Dict
+
+import numpy as np
+
+# name -> (width, height, seconds, fps)
+SIZES = {
+    'tiny': (320, 180, 4, 15),
+    'small': (640, 360, 10, 25),
+    'medium': (1280, 720, 20, 30),
+    'large': (1920, 1080, 30, 30),
+}
+MEDIA_DIR = 'bench_media'
+WORDS = ('so the thing about this is that nobody really tells you how fast it all moves once you start '
+         'building every single day and shipping small pieces until the whole idea finally clicks').split()
+
+
+def ffmpeg_exe() -> str:
+    """System ffmpeg, or the binary bundled with imageio-ffmpeg (a moviepy dependency)."""
+    exe = shutil.which('ffmpeg')
+    if exe:
+        return exe
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def ensure_ffmpeg_on_path() -> str:
+    """Stages shell out to plain `ffmpeg`; expose the bundled binary under that name if needed."""
+    if shutil.which('ffmpeg'):
+        return shutil.which('ffmpeg')
+    exe = ffmpeg_exe()
+    bin_dir = os.path.join(tempfile.gettempdir(), 'shorts_bench_bin')
+    os.makedirs(bin_dir, exist_ok=True)
+    link = os.path.join(bin_dir, 'ffmpeg')
+    if not os.path.exists(link):
+        os.symlink(exe, link)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    return link
+
+
+def make_face_png(path: str, size: int) -> str:
+    """Cartoon frontal face (skin oval, brows, eyes, nose, mouth) on a transparent background."""
+    import cv2  # only needed the first time a fixture is generated
+    img = np.zeros((size, size, 4), np.uint8)
+    c = size // 2
+    cv2.ellipse(img, (c, c), (int(size*0.36), int(size*0.46)), 0, 0, 360, (150, 185, 225, 255), -1)
+    for dx in (-1, 1):
+        ex = c + dx*int(size*0.16)
+        cv2.ellipse(img, (ex, int(size*0.40)), (int(size*0.08), int(size*0.045)), 0, 0, 360, (255, 255, 255, 255), -1)
+        cv2.circle(img, (ex, int(size*0.40)), int(size*0.035), (40, 30, 20, 255), -1)
+        cv2.line(img, (ex - int(size*0.09), int(size*0.31)), (ex + int(size*0.09), int(size*0.31)), (40, 50, 70, 255),
+                 max(2, size // 40))
+    cv2.line(img, (c, int(size*0.45)), (c, int(size*0.60)), (110, 140, 180, 255), max(2, size // 50))
+    cv2.ellipse(img, (c, int(size*0.70)), (int(size*0.14), int(size*0.05)), 0, 0, 180, (60, 60, 160, 255),
+                max(2, size // 30))
+    cv2.imwrite(path, img)
+    return path
+
+
+def make_video(path: str, w: int, h: int, seconds: float, fps: int, face_png: str) -> str:
+    """testsrc2 background, a face drifting left/right and a syllable-modulated tone with pauses."""
+    speech = ('0.4*sin(2*PI*(170+40*sin(2*PI*0.7*t))*t)*(0.55+0.45*sin(2*PI*4*t))'
+              '*gt(mod(t\\,3.5)\\,0.6)')
+    graph = (f"[0:v][1:v]overlay=x='(W-w)/2+(W-w)/3*sin(2*PI*t/{max(1.0, seconds/2):.2f})'"
+             f":y='(H-h)/2+(H-h)/6*cos(2*PI*t/5)':shortest=1,format=yuv420p[v]")
+    cmd = [ffmpeg_exe(), '-y', '-loglevel', 'error',
+           '-f', 'lavfi', '-i', f'testsrc2=size={w}x{h}:rate={fps}:duration={seconds}',
+           '-loop', '1', '-i', face_png,
+           '-f', 'lavfi', '-i', f"aevalsrc={speech}:s=44100:d={seconds}",
+           '-filter_complex', graph, '-map', '[v]', '-map', '2:a',
+           '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(fps*2), '-c:a', 'aac', '-t', str(seconds), path]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def make_srt(path: str, seconds: float, seed: int = 7, seg_len: float = 2.5) -> str:
+    rng = random.Random(seed)
+    lines = []
+    t, idx = 0.0, 1
+    while t < seconds:
+        end = min(seconds, t + seg_len - 0.1)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 9)))
+        lines.append(f"{idx}\n{_ts(t)} --> {_ts(end)}\n{text}\n\n")
+        t += seg_len
+        idx += 1
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    return path
+
+
+def _ts(t: float) -> str:
+    ms = int(round(t * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def fixtures(size: str, media_dir: str = MEDIA_DIR) -> Dict[str, str]:
+    """Create (or reuse) the synthetic video and SRT for a size; generation is deterministic."""
+    w, h, seconds, fps = SIZES[size]
+    os.makedirs(media_dir, exist_ok=True)
+    video = os.path.join(media_dir, f'{size}_{w}x{h}_{seconds}s.mp4')
+    srt = os.path.join(media_dir, f'{size}_{seconds}s.srt')
+    if not os.path.exists(video):
+        face = make_face_png(os.path.join(media_dir, f'face_{h}.png'), max(48, h // 3))
+        make_video(video, w, h, seconds, fps, face)
+    if not os.path.exists(srt):
+        make_srt(srt, seconds)
+    return {'video': video, 'srt': srt}
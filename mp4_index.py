@@ -0,0 +1,337 @@
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# fetch(offset, length) -> bytes; backed by HTTP range requests or a local file.
+Fetch = Callable[[int, int], bytes]
+# (src_start, src_end_exclusive, dst_offset)
+CopyPlan = List[Tuple[int, int, int]]
+
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'dinf'}
+# Ranges closer than this are fetched as one request
+MERGE_GAP = 256 * 1024
+# Bytes fetched per box-header read; consecutive small boxes (ftyp, sidx, moof headers) come in one request
+READ_AHEAD = 16 * 1024
+
+
+def _iter_boxes(buf: bytes, start: int = 0, end: Optional[int] = None):
+    end = len(buf) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, typ = struct.unpack('>I4s', buf[pos:pos+8])
+        hdr = 8
+        if size == 1:
+            size = struct.unpack('>Q', buf[pos+8:pos+16])[0]
+            hdr = 16
+        elif size == 0:
+            size = end - pos
+        if size < hdr:
+            break
+        yield typ, pos, hdr, size
+        pos += size
+
+
+def _read_ahead(fetch: Fetch, block: int = READ_AHEAD) -> Fetch:
+    """fetch serving small reads from the last block fetched, so adjacent box headers share one request."""
+    cache = [0, b'']
+
+    def read(offset: int, length: int) -> bytes:
+        start, data = cache
+        if start <= offset and offset + length <= start + len(data):
+            return data[offset - start:offset - start + length]
+        if length > block:
+            return fetch(offset, length)
+        data = fetch(offset, block)
+        cache[:] = [offset, data]
+        return data[:length]
+    return read
+
+
+def scan_top_level(fetch: Fetch, file_size: int) -> Tuple[List[Tuple[bytes, int, int]], List[Tuple[int, int, list]]]:
+    """Walk top-level box headers; returns ((type, offset, size) tuples, parsed sidx boxes).
+
+    Fragments referenced by a sidx are jumped over instead of being walked box by box,
+    and the walk stops at the first moof no sidx covers (a fragmented file without an
+    index), so a global sidx is found in a few requests however many fragments follow.
+    """
+    boxes: List[Tuple[bytes, int, int]] = []
+    sidx: List[Tuple[int, int, list]] = []
+    indexed_to = 0  # end of the bytes referenced by the sidx boxes seen so far
+    pos = 0
+    while pos + 8 <= file_size:
+        h = fetch(pos, 16)
+        size, typ = struct.unpack('>I4s', h[:8])
+        if size == 1:
+            size = struct.unpack('>Q', h[8:16])[0]
+        elif size == 0:
+            size = file_size - pos
+        if size < 8:
+            break
+        boxes.append((typ, pos, size))
+        if typ == b'sidx':
+            (ref_id, timescale), segs = _parse_sidx(fetch(pos, size)[8:], pos + size)
+            sidx.append((ref_id, timescale, segs))
+            if segs:
+                indexed_to = max(indexed_to, segs[-1][2] + segs[-1][3])
+        elif typ == b'moof':
+            if indexed_to <= pos:
+                break
+            pos = indexed_to
+            continue
+        pos += size
+    return boxes, sidx
+
+
+def merge_ranges(ranges: List[Tuple[int, int]], gap: int = 0) -> List[Tuple[int, int]]:
+    out: List[Tuple[int, int]] = []
+    for a, b in sorted(ranges):
+        if out and a <= out[-1][1] + gap:
+            out[-1] = (out[-1][0], max(out[-1][1], b))
+        else:
+            out.append((a, b))
+    return out
+
+
+class Track:
+    """Sample table of one classic (non-fragmented) MP4 track."""
+
+    def __init__(self, kind: str, times: np.ndarray, offsets: np.ndarray, sizes: np.ndarray, sync: Optional[np.ndarray]):
+        self.kind = kind
+        self.times = times
+        self.offsets = offsets
+        self.sizes = sizes
+        self.sync = sync
+
+    def sample_span(self, t0: float, t1: float) -> Tuple[int, int]:
+        """[lo, hi) sample indices covering t0..t1, widened to whole GOPs."""
+        lo = max(0, int(np.searchsorted(self.times, t0, 'right')) - 1)
+        hi = int(np.searchsorted(self.times, t1, 'right'))
+        if self.sync is not None and len(self.sync):
+            k = max(0, int(np.searchsorted(self.sync, lo, 'right')) - 1)
+            lo = min(lo, int(self.sync[k]))
+            k = int(np.searchsorted(self.sync, hi, 'left'))
+            hi = int(self.sync[k]) if k < len(self.sync) else len(self.times)
+        return lo, hi
+
+    def ranges(self, t0: float, t1: float) -> List[Tuple[int, int]]:
+        lo, hi = self.sample_span(t0, t1)
+        if hi <= lo:
+            return []
+        starts = self.offsets[lo:hi]
+        return merge_ranges(list(zip(starts.tolist(), (starts + self.sizes[lo:hi]).tolist())))
+
+
+def _full(payload: bytes) -> Tuple[int, bytes]:
+    return payload[0], payload[4:]
+
+
+def _parse_trak(buf: bytes, start: int, end: int) -> Optional[Track]:
+    tables: Dict[bytes, bytes] = {}
+
+    def walk(a: int, b: int):
+        for typ, pos, hdr, size in _iter_boxes(buf, a, b):
+            if typ in CONTAINERS:
+                walk(pos + hdr, pos + size)
+            elif typ in (b'mdhd', b'hdlr', b'stts', b'stss', b'stsc', b'stsz', b'stco', b'co64'):
+                tables[typ] = buf[pos + hdr:pos + size]
+    walk(start, end)
+    if b'mdhd' not in tables or b'stsz' not in tables:
+        return None
+
+    ver, p = _full(tables[b'mdhd'])
+    timescale = struct.unpack('>I', p[16:20] if ver == 1 else p[8:12])[0]
+    kind = tables.get(b'hdlr', b'\0' * 12)[8:12].decode('ascii', 'replace')
+
+    _, p = _full(tables[b'stsz'])
+    fixed, n = struct.unpack('>II', p[:8])
+    sizes = np.full(n, fixed, np.int64) if fixed else np.frombuffer(p[8:8 + 4*n], '>u4').astype(np.int64)
+
+    _, p = _full(tables.get(b'stts', b'\0' * 8))
+    cnt = struct.unpack('>I', p[:4])[0]
+    runs = np.frombuffer(p[4:4 + 8*cnt], '>u4').reshape(-1, 2).astype(np.int64)
+    deltas = np.repeat(runs[:, 1], runs[:, 0])[:n]
+    times = np.concatenate([[0], np.cumsum(deltas)])[:n] / float(timescale or 1)
+
+    if b'co64' in tables:
+        _, p = _full(tables[b'co64'])
+        cnt = struct.unpack('>I', p[:4])[0]
+        chunk_offsets = np.frombuffer(p[4:4 + 8*cnt], '>u8').astype(np.int64)
+    else:
+        _, p = _full(tables.get(b'stco', b'\0' * 8))
+        cnt = struct.unpack('>I', p[:4])[0]
+        chunk_offsets = np.frombuffer(p[4:4 + 4*cnt], '>u4').astype(np.int64)
+
+    _, p = _full(tables.get(b'stsc', b'\0' * 8))
+    cnt = struct.unpack('>I', p[:4])[0]
+    stsc = np.frombuffer(p[4:4 + 12*cnt], '>u4').reshape(-1, 3).astype(np.int64)
+    nchunks = len(chunk_offsets)
+    spc = np.zeros(nchunks, np.int64)
+    firsts = list(stsc[:, 0]) + [nchunks + 1]
+    for k in range(len(stsc)):
+        spc[firsts[k] - 1:firsts[k + 1] - 1] = stsc[k, 1]
+
+    chunk_of = np.repeat(np.arange(nchunks), spc)[:n]
+    pos_in_stream = np.concatenate([[0], np.cumsum(sizes)])[:n]
+    chunk_first = np.concatenate([[0], np.cumsum(spc)])[:nchunks]
+    offsets = chunk_offsets[chunk_of] + pos_in_stream - pos_in_stream[np.minimum(chunk_first[chunk_of], max(0, n - 1))]
+
+    sync = None
+    if b'stss' in tables:
+        _, p = _full(tables[b'stss'])
+        cnt = struct.unpack('>I', p[:4])[0]
+        sync = np.frombuffer(p[4:4 + 4*cnt], '>u4').astype(np.int64) - 1
+    return Track(kind, times, offsets, sizes, sync)
+
+
+def _parse_sidx(payload: bytes, sidx_end: int) -> Tuple[Tuple[int, int], List[Tuple[float, float, int, int, int]]]:
+    """((reference_id, timescale), segments) of a fragmented MP4; segments are (t0, t1, offset, size, sap)."""
+    ver, p = _full(payload)
+    ref_id, timescale = struct.unpack('>II', p[:8])
+    timescale = timescale or 1
+    if ver == 0:
+        pts, first = struct.unpack('>II', p[8:16])
+        p = p[16:]
+    else:
+        pts, first = struct.unpack('>QQ', p[8:24])
+        p = p[24:]
+    count = struct.unpack('>H', p[2:4])[0]
+    segs = []
+    off = sidx_end + first
+    t = pts / timescale
+    for k in range(count):
+        ref, dur, sap = struct.unpack('>III', p[4 + 12*k:16 + 12*k])
+        size = ref & 0x7FFFFFFF
+        segs.append((t, t + dur / timescale, off, size, sap))
+        off += size
+        t += dur / timescale
+    return (ref_id, timescale), segs
+
+
+def _merge_sidx(entries: List[Tuple[int, int, list]]) -> List[Tuple[int, int, list]]:
+    """One (reference_id, timescale, segments) entry per track, in file order.
+
+    Files with a sidx per fragment (ffmpeg -movflags dash) have many boxes per track;
+    their references are concatenated.
+    """
+    merged: Dict[int, Tuple[int, list]] = {}
+    for ref_id, timescale, segs in entries:
+        merged.setdefault(ref_id, (timescale, []))[1].extend(segs)
+    return [(ref_id, timescale, sorted(segs, key=lambda sg: sg[2]))
+            for ref_id, (timescale, segs) in merged.items() if segs]
+
+
+def _build_sidx(ref_id: int, timescale: int, segs: List[Tuple[float, float, int, int, int]], first_offset: int = 0) -> bytes:
+    """sidx box for the kept fragments; each one's duration runs to the next kept fragment."""
+    refs = b''
+    for k, (t0, t1, _, size, sap) in enumerate(segs):
+        end = segs[k + 1][0] if k + 1 < len(segs) else t1
+        refs += struct.pack('>III', size & 0x7FFFFFFF, int(round((end - t0) * timescale)), sap)
+    body = struct.pack('>B3sIIQQHH', 1, b'\0\0\0', ref_id, timescale, int(round(segs[0][0] * timescale)), first_offset, 0, len(segs))
+    body += refs
+    return struct.pack('>I4s', 8 + len(body), b'sidx') + body
+
+
+class MP4Index:
+    """Time -> byte-range index of an MP4, built from its moov or sidx box."""
+
+    def __init__(self, size: int, header: List[Tuple[int, int]], tracks: List[Track],
+                 sidx: Optional[List[Tuple[int, int, List[Tuple[float, float, int, int, int]]]]] = None):
+        self.size = size
+        self.header = header
+        self.tracks = tracks
+        # One (reference_id, timescale, segments) entry per track, merged over all its sidx boxes
+        self.sidx = sidx or []
+        self.segments = self.sidx[0][2] if self.sidx else []
+
+    @property
+    def fragmented(self) -> bool:
+        return bool(self.segments)
+
+    def window_segments(self, windows: List[Tuple[float, float]], pad: float = 1.0) -> List[int]:
+        """Indices of fragments overlapping any padded window (fragmented files only)."""
+        # The first fragment is always kept so the file still starts at t=0.
+        keep = {0} if self.segments else set()
+        for t0, t1 in windows:
+            a, b = max(0.0, t0 - pad), t1 + pad
+            keep.update(k for k, sg in enumerate(self.segments) if sg[1] > a and sg[0] < b)
+        return sorted(keep)
+
+    def window_ranges(self, windows: List[Tuple[float, float]], pad: float = 1.0) -> List[Tuple[int, int]]:
+        """Media byte ranges covering all windows, padded by pad seconds and widened to whole GOPs."""
+        if self.fragmented:
+            segs = [self.segments[k] for k in self.window_segments(windows, pad)]
+            return merge_ranges([(sg[2], sg[2] + sg[3]) for sg in segs])
+        # Decoders probe the first packets when opening a file, so the first GOP
+        # is always kept to avoid them reading zeros.
+        rs: List[Tuple[int, int]] = []
+        for t0, t1 in [(0.0, pad)] + list(windows):
+            for tr in self.tracks:
+                rs += tr.ranges(max(0.0, t0 - pad), t1 + pad)
+        return merge_ranges(rs, MERGE_GAP)
+
+    def partial_layout(self, windows: List[Tuple[float, float]], pad: float = 1.0) -> Tuple[int, CopyPlan, List[Tuple[int, bytes]]]:
+        """Return (dest_size, copy plan, literal writes) for a playable partial copy of the file.
+
+        Classic MP4s keep their original layout (a sparse file where only the header
+        and the needed samples are filled in), so the sample tables stay valid.
+        Fragmented MP4s are compacted to the init segment, a rewritten sidx and the
+        needed fragments; the sidx keeps seeking on the original timeline.
+        """
+        if not self.fragmented:
+            media = self.window_ranges(windows, pad)
+            return self.size, [(a, b, a) for a, b in merge_ranges(self.header + media)], []
+        segs = [self.segments[k] for k in self.window_segments(windows, pad)]
+        kept = set(sg[2] for sg in segs)
+        plan: CopyPlan = []
+        dst = 0
+        for a, b in self.header:
+            plan.append((a, b, dst))
+            dst += b - a
+        # Rebuild every sidx from the back so each first_offset can skip the boxes after it
+        boxes: List[bytes] = []
+        for ref_id, timescale, track_segs in reversed(self.sidx):
+            track_kept = [sg for sg in track_segs if sg[2] in kept]
+            if track_kept:
+                boxes.insert(0, _build_sidx(ref_id, timescale, track_kept, sum(len(b) for b in boxes)))
+        literals = [(dst, b''.join(boxes))]
+        dst += len(literals[0][1])
+        for a, b in merge_ranges([(sg[2], sg[2] + sg[3]) for sg in segs]):
+            plan.append((a, b, dst))
+            dst += b - a
+        return dst, plan, literals
+
+
+def load_index(fetch: Fetch, file_size: int) -> MP4Index:
+    fetch = _read_ahead(fetch)
+    boxes, found = scan_top_level(fetch, file_size)
+    header: List[Tuple[int, int]] = []
+    tracks: List[Track] = []
+    for typ, off, size in boxes:
+        if typ in (b'mdat', b'moof', b'mfra', b'sidx'):
+            continue
+        header.append((off, off + size))
+        if typ == b'moov':
+            buf = fetch(off, size)
+            for t, pos, hdr, sz in _iter_boxes(buf, 8):
+                if t == b'trak':
+                    tr = _parse_trak(buf, pos + hdr, pos + sz)
+                    if tr is not None and len(tr.times):
+                        tracks.append(tr)
+    sidx = _merge_sidx(found)
+    if sidx:
+        first_media = min(segs[0][2] for _, _, segs in sidx)
+        header = [(a, b) for a, b in header if b <= first_media]
+    if not tracks and not sidx:
+        if any(typ == b'moof' for typ, _, _ in boxes):
+            raise ValueError('Fragmented MP4 without a segment index (sidx)')
+        raise ValueError('MP4 has no usable sample tables or segment index')
+    return MP4Index(file_size, header, tracks, sidx)
+
+
+def file_fetch(path: str) -> Fetch:
+    def fetch(offset: int, length: int) -> bytes:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+    return fetch
@@ -0,0 +1,119 @@
+import io
+import os
+import threading
+import zipfile
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+# Already-compressed media gains nothing from deflate, so it is stored as-is.
+STORED_EXTS = {'.mp4', '.mov', '.mkv', '.webm', '.m4a', '.mp3', '.aac', '.png', '.jpg', '.jpeg', '.gif', '.zip'}
+BLOCK = 1024 * 1024
+
+Entry = Union[str, Tuple[str, str]]
+
+
+def compress_type_for(path: str) -> int:
+    return zipfile.ZIP_STORED if os.path.splitext(path)[1].lower() in STORED_EXTS else zipfile.ZIP_DEFLATED
+
+
+def _entry(e: Entry) -> Tuple[str, str]:
+    return (e, e) if isinstance(e, str) else e
+
+
+class ClipPackager:
+    """ZIP archive that files are appended to as soon as they are finished."""
+
+    def __init__(self, zip_path: str):
+        self.zip_path = zip_path
+        self.names = set()
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(zip_path, 'w')
+
+    def add(self, path: str, arcname: Optional[str] = None) -> bool:
+        arcname = arcname or path
+        with self._lock:
+            if arcname in self.names or not os.path.exists(path):
+                return False
+            self._zip.write(path, arcname, compress_type=compress_type_for(path))
+            self.names.add(arcname)
+            return True
+
+    def close(self) -> str:
+        with self._lock:
+            self._zip.close()
+        return self.zip_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target; zipfile then writes data descriptors instead of seeking back."""
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.buf += b
+        return len(b)
+
+    def take(self) -> bytes:
+        out = bytes(self.buf)
+        self.buf.clear()
+        return out
+
+
+def stream_zip(entries: Iterable[Entry]) -> Iterator[bytes]:
+    """Yield a ZIP archive chunk by chunk while entries (paths or (path, arcname)) arrive.
+
+    entries may be a generator that blocks until the next file is finished, so a
+    client can start downloading before the last file exists.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as z:
+        for e in entries:
+            path, arcname = _entry(e)
+            if not os.path.exists(path):
+                continue
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = compress_type_for(path)
+            with open(path, 'rb') as src, z.open(info, 'w', force_zip64=info.file_size > 0x7FFFFFFF) as dst:
+                while True:
+                    buf = src.read(BLOCK)
+                    if not buf:
+                        break
+                    dst.write(buf)
+                    if len(sink.buf) >= BLOCK:
+                        yield sink.take()
+            yield sink.take()
+    tail = sink.take()
+    if tail:
+        yield tail
+
+
+def send_zip_stream(handler, chunks: Iterable[bytes], filename: str = 'results.zip') -> None:
+    """Write chunks as a streaming ZIP response on an http.server handler.
+
+    HTTP/1.1 handlers get chunked encoding; HTTP/1.0 ones stream until the
+    connection closes.
+    """
+    chunked = handler.protocol_version >= 'HTTP/1.1'
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/zip')
+    handler.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+    if chunked:
+        handler.send_header('Transfer-Encoding', 'chunked')
+    else:
+        handler.close_connection = True
+    handler.end_headers()
+    for c in chunks:
+        if c:
+            handler.wfile.write(f'{len(c):X}\r\n'.encode() + c + b'\r\n' if chunked else c)
+            handler.wfile.flush()
+    if chunked:
+        handler.wfile.write(b'0\r\n\r\n')
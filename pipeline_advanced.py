@@ -1,22 +1,27 @@
-import os, zipfile
+import os, json, time
+from contextlib import contextmanager
 from typing import List, Dict, Tuple, Optional
-import numpy as np
-from moviepy import VideoFileClip, TextClip, CompositeVideoClip, ImageClip
-from pytubefix import YouTube
-from faster_whisper import WhisperModel
 
 from subs_utils import parse_srt_segments, segs_to_text, words_from_segs, write_ass_karaoke, burn_ass_to_video, write_srt_for_range
-from video_utils import crop_center, crop_face_track
+from video_utils import (crop_path_from_centers, aspect_tag, output_resolution, plan_geometry, title_overlay,
+                         watermark_overlay)
+from frame_pipeline import CropTarget, Overlay, probe_video, render_crops
+from face_store import FaceTrackStore
+from audio_features import build_audio_index
 from llm_utils import pick_highlights, generate_titles_from_highlights
+from boundary_utils import refine_highlights
+from encode_profiles import DEFAULT_TIER
+from download_utils import start_youtube_download
+from package_utils import ClipPackager
+from trace_utils import span
+from concurrency_utils import stage_slot
 
 
-def download_youtube(url: str) -> Optional[str]:
+def download_youtube(url: str, logger=print) -> Optional[str]:
+    """Blocking download of a YouTube video (served from the source cache when possible)."""
     try:
-        yt = YouTube(url)
-        stream = (yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first() or
-                  yt.streams.filter(file_extension='mp4').order_by('resolution').desc().first())
-        os.makedirs('videos', exist_ok=True)
-        return stream.download(output_path='videos')
+        src = start_youtube_download(url, logger=logger)
+        return src.video_path() if src else None
     except Exception:
         return None
 
@@ -27,64 +32,177 @@ def transcribe(video_path: str):
         device = 'cuda' if getattr(torch, 'cuda', None) and torch.cuda.is_available() else 'cpu'
     except Exception:
         device = 'cpu'
-    model = WhisperModel('base.en', device=device, compute_type='float16' if device=='cuda' else 'int8')
-    seg_iter, _ = model.transcribe(video_path, beam_size=5, language='en', word_timestamps=True)
-    segs = []
-    for s in seg_iter:
-        words = []
-        if getattr(s, 'words', None):
-            for w in s.words:
-                words.append({'start': float(w.start), 'end': float(w.end), 'text': w.word})
-        segs.append({'start': float(s.start), 'end': float(s.end), 'text': s.text.strip(), 'words': words})
+    from faster_whisper import WhisperModel
+    with stage_slot('cpu'), span('transcribe', device=device) as sp:
+        model = WhisperModel('base.en', device=device, compute_type='float16' if device=='cuda' else 'int8')
+        seg_iter, _ = model.transcribe(video_path, beam_size=5, language='en', word_timestamps=True)
+        segs = []
+        for s in seg_iter:
+            words = []
+            if getattr(s, 'words', None):
+                for w in s.words:
+                    words.append({'start': float(w.start), 'end': float(w.end), 'text': w.word})
+            segs.append({'start': float(s.start), 'end': float(s.end), 'text': s.text.strip(), 'words': words})
+        sp.attrs['segments'] = len(segs)
+        sp.add_file_io(read_path=video_path)
     return segs, segs_to_text(segs)
 
 
-def add_title_overlay(video_path: str, out_path: str, title_text: str, platform: str = 'TikTok'):
-    with VideoFileClip(video_path) as v:
-        w, h = v.w, v.h
-        margin = int(0.10*h if platform == 'TikTok' else 0.08*h)
-        txt = TextClip(title_text, font='FreeMono', fontsize=max(36, int(h*0.05)), color='white', stroke_color='black', stroke_width=2)
-        txt = txt.set_pos(('center', margin)).set_duration(v.duration)
-        CompositeVideoClip([v, txt]).write_videofile(out_path, codec='libx264', audio_codec='aac')
+FACE_SAMPLE_FPS = 4.0
 
 
-def add_watermark(video_path: str, wm_path: str, out_path: str):
-    with VideoFileClip(video_path) as v:
-        wm = (ImageClip(wm_path).set_duration(v.duration).resize(height=int(max(48, v.h*0.06))).set_pos(('right','top')))
-        CompositeVideoClip([v, wm]).write_videofile(out_path, codec='libx264', audio_codec='aac')
+def parse_aspects(aspect) -> List[str]:
+    """'9:16', '9:16,1:1' or ['9:16', '1:1'] -> ['9:16', '1:1'] (order kept, duplicates dropped)."""
+    items = aspect.split(',') if isinstance(aspect, str) else list(aspect or [])
+    out: List[str] = []
+    for a in (x.strip() for x in items):
+        if a and a not in out:
+            out.append(a)
+    return out or ['9:16']
 
 
-def generate_pipeline(youtube_url, video_file, srt_file, provider, openai_key, gemini_key, min_len, max_len, max_clips, aspect, crop_mode, karaoke, export_srt, title_mode, custom_title, platform, out_prefix, watermark_file, seo_text: str = '', logger=print):
-    # Get path
+def _progress(logger, stage: str, message: str, **data) -> None:
+    """Report a pipeline step. Structured loggers (job_server.JobEvents) also get the stage and data."""
+    event = getattr(logger, 'event', None)
+    if event is not None:
+        event(stage, message, **data)
+    else:
+        logger(message)
+
+
+def _overlays(info, ratio: str, tier: str, title: str, platform: str, wm_path: Optional[str],
+              logger=print) -> List[Overlay]:
+    """Title card and watermark for one output; render_crops blends them into every frame."""
+    geo = plan_geometry(info.width, info.height, ratio, tier)
+    out = []
+    if title:
+        try:
+            out.append(title_overlay(title, geo, platform))
+        except Exception as ex:
+            logger(f"Title overlay failed: {ex}")
+    if wm_path:
+        try:
+            out.append(watermark_overlay(wm_path, geo))
+        except Exception as ex:
+            logger(f"Watermark failed: {ex}")
+    return out
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], key: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - t0
+
+
+def _format_timings(tier: str, timings: Dict[str, float], n: int) -> str:
+    parts = ', '.join(f"{k} {v:.2f}s" for k, v in timings.items())
+    total = sum(timings.values())
+    return f"[{tier}] {n} clip(s) in {total:.2f}s ({total/max(1, n):.2f}s/clip): {parts or 'nothing rendered'}"
+
+
+def _supersede(old: str, new: str) -> str:
+    """Delete an intermediate render once the next stage has replaced it."""
+    if old != new:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return new
+
+
+def _finish_clip(cur: str, stem: str, ass: Optional[str], tier: str, timings: Dict[str, float],
+                 logger=print) -> str:
+    """Burn karaoke onto a rendered clip; returns the last output path.
+
+    The title card and watermark are already in the frames (_overlays). Karaoke needs
+    libass, so it stays an ffmpeg pass; its input is removed once the output exists.
+    """
+    if ass and os.path.exists(ass):
+        kara = f"{stem}_karaoke.mp4"
+        try:
+            with _timed(timings, 'karaoke'):
+                burn_ass_to_video(cur, ass, kara, tier)
+            cur = _supersede(cur, kara)
+        except Exception as ex:
+            logger(f"Karaoke burn failed: {ex}")
+    return cur
+
+
+def write_render_plan(plan: Dict, path: str) -> str:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=2)
+    return path
+
+
+def load_render_plan(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def generate_pipeline(youtube_url, video_file, srt_file, provider, openai_key, gemini_key, min_len, max_len, max_clips, aspect, crop_mode, karaoke, export_srt, title_mode, custom_title, platform, out_prefix, watermark_file, seo_text: str = '', logger=print, tier: str = DEFAULT_TIER, partial_download: bool = False, on_file=None):
+    # Get path. YouTube sources download audio first so transcription can start
+    # while the video stream is still arriving. With partial_download the video
+    # waits until highlights are known and only their byte ranges are fetched.
     path = None
+    yt_src = None
+    audio_src = None
     if youtube_url:
-        path = download_youtube(youtube_url)
-        if path: logger(f"Downloaded YouTube -> {path}")
-    if not path and video_file is not None:
+        yt_src = start_youtube_download(youtube_url, logger=logger, fetch_video=not partial_download)
+    if yt_src is None and video_file is not None:
         path = video_file.name
-    if not path:
-        logger('No video provided.')
+    if yt_src is None and not path:
+        _progress(logger, 'error', 'No video provided.')
         return None
 
     # Transcription
     if srt_file is not None:
+        _progress(logger, 'transcribe', 'Loading subtitles from SRT', source='srt')
         segs = parse_srt_segments(srt_file.name)
         text = segs_to_text(segs)
         segs = words_from_segs(segs)
     else:
-        segs, text = transcribe(path)
+        media = path or yt_src.audio_path() or yt_src.video_path()
+        if not media:
+            _progress(logger, 'error', 'Download failed.')
+            return None
+        _progress(logger, 'transcribe', 'Transcribing audio', source='whisper')
+        segs, text = transcribe(media)
+        audio_src = media
     if not text:
-        logger('Empty transcription')
+        _progress(logger, 'error', 'Empty transcription')
         return None
+    _progress(logger, 'transcribed', f"Transcribed {len(segs)} segment(s)", segments=len(segs))
 
     api_key = openai_key if provider == 'OpenAI' else gemini_key
     if not api_key:
-        logger(f"Missing API key for {provider}. Please provide a valid key.")
+        _progress(logger, 'error', f"Missing API key for {provider}. Please provide a valid key.")
         return None
-    highs = pick_highlights(text, provider, api_key, int(max_clips), int(min_len), int(max_len))
+
+    # Audio features (loudness, flux, VAD, silences) feed highlight hints, cut snapping
+    # and loudness normalization; the index is cached per source and optional.
+    audio = None
+    audio_src = audio_src or path or (yt_src.audio_path() if yt_src is not None else None)
+    if audio_src:
+        try:
+            audio = build_audio_index(audio_src)
+        except Exception as ex:
+            logger(f"Audio analysis skipped: {ex}")
+    peaks = audio.peaks(top=2 * int(max_clips)) if audio is not None else None
+
+    _progress(logger, 'highlights', f"Picking highlights with {provider}", provider=provider)
+    highs = pick_highlights(text, provider, api_key, int(max_clips), int(min_len), int(max_len), audio_peaks=peaks)
     if not highs:
-        logger('No highlights found.')
+        _progress(logger, 'error', 'No highlights found.')
         return None
+    # Snap LLM times to sentence/pause edges, fit them into [min_len, max_len], drop duplicates.
+    with span('refine_boundaries', clips=len(highs)):
+        highs = refine_highlights(highs, segs, int(min_len), int(max_len),
+                                  audio.silences() if audio is not None else (),
+                                  audio.duration if audio is not None else None)
+    _progress(logger, 'highlights_done', f"Found {len(highs)} highlight(s)", clips=len(highs))
 
     if title_mode == 'Auto':
         titles = generate_titles_from_highlights(highs, provider, api_key)
@@ -93,83 +211,162 @@ def generate_pipeline(youtube_url, video_file, srt_file, provider, openai_key, g
     else:
         titles = [''] * len(highs)
 
+    if yt_src is not None:
+        if partial_download:
+            path = yt_src.video_windows([(float(h['start']), float(h['end'])) for h in highs])
+        else:
+            path = yt_src.video_path()
+        if not path:
+            _progress(logger, 'error', 'Download failed.')
+            return None
+        _progress(logger, 'downloaded', f"Downloaded YouTube -> {path}", path=path)
+
     out_pref = out_prefix or 'short'
+    aspects = parse_aspects(aspect)
     outputs: List[str] = []
-    srt_outputs: List[str] = []
-
-    for i, h in enumerate(highs, start=1):
-        s, e = float(h['start']), float(h['end'])
-        clip_path = f"{out_pref}_{i}.mp4"
-        with VideoFileClip(path) as v:
-            sub = v.subclip(s, e)
-            if crop_mode == 'Face-track':
-                sub = crop_face_track(sub, aspect)
-            else:
-                sub = crop_center(sub, aspect)
-            logger(f"Rendering clip {i}: {s:.2f}s to {e:.2f}s")
-            sub.write_videofile(clip_path, codec='libx264', audio_codec='aac')
-
-        # Optional per-clip SRT export (before any overlays/watermarks)
+    plan_clips: List[Dict] = []
+    timings: Dict[str, float] = {}
+    wm_path = watermark_file.name if watermark_file is not None else None
+    info = probe_video(path)
+    # Face boxes are shared by every clip and aspect and cached on disk per source.
+    faces = FaceTrackStore(path, info, FACE_SAMPLE_FPS) if crop_mode == 'Face-track' else None
+
+    # Finished files go into the ZIP (and to on_file) right away instead of after
+    # the last render.
+    zip_path = f"{out_pref}_{'preview' if tier == 'preview' else 'results'}.zip"
+    packager = ClipPackager(zip_path)
+
+    def deliver(f: str):
+        with _timed(timings, 'package'):
+            added = packager.add(f, os.path.basename(f))
+        if added and on_file is not None:
+            on_file((f, os.path.basename(f)))
+
+    try:
+        for i, h in enumerate(highs, start=1):
+            s, e = float(h['start']), float(h['end'])
+            # Face analysis is aspect independent: one pass serves every requested ratio,
+            # and samples already analysed for an overlapping clip or an earlier run are reused.
+            centers = None
+            if faces is not None:
+                with _timed(timings, 'face_track'):
+                    new = faces.ensure(s, e)
+                    centers = faces.centers(s, e)
+                if not new:
+                    logger(f"Face track for clip {i} served from cache")
+
+            ttl = titles[i-1] if i-1 < len(titles) else ''
+            targets = []
+            for ratio in aspects:
+                clip_stem = f"{out_pref}_{i}" + (f"_{aspect_tag(ratio)}" if len(aspects) > 1 else '')
+                stem = clip_stem + ('_preview' if tier == 'preview' else '')
+                crop_path = crop_path_from_centers(centers, info.width, info.height, ratio) if centers else None
+                overlays = _overlays(info, ratio, tier, ttl, platform, wm_path, logger)
+                targets.append((clip_stem, stem, CropTarget(f"{stem}.mp4", ratio, crop_path, None, overlays)))
+
+            gain = audio.gain_to_target(s, e) if audio is not None else 0.0
+            _progress(logger, 'render', f"Rendering clip {i} ({tier}, {', '.join(aspects)}): {s:.2f}s to {e:.2f}s",
+                      clip=i, clips=len(highs), start=s, end=e, tier=tier, aspects=aspects, audio_gain_db=gain)
+            with _timed(timings, 'render'):
+                render_crops(path, s, e, [t for _, _, t in targets], tier, info=info, audio_gain_db=gain)
+
+            # Optional per-clip SRT export (before any overlays/watermarks)
+            srt_path = None
+            if export_srt and segs:
+                try:
+                    srt_path = f"{out_pref}_{i}.srt"
+                    write_srt_for_range(segs, srt_path, s, e)
+                except Exception as ex:
+                    srt_path = None
+                    logger(f"SRT export failed for clip {i}: {ex}")
+
+            for clip_stem, stem, tgt in targets:
+                ass = None
+                if karaoke and segs:
+                    ass = f"{clip_stem}.ass"
+                    write_ass_karaoke(segs, ass, s, e, output_resolution(tgt.ratio))
+
+                outputs.append(_finish_clip(tgt.out_path, stem, ass, tier, timings, logger))
+                deliver(outputs[-1])
+                _progress(logger, 'clip_done', f"Clip {i}/{len(highs)} ({tgt.ratio}) ready -> {outputs[-1]}",
+                          clip=i, clips=len(highs), aspect=tgt.ratio, path=outputs[-1])
+                plan_clips.append({'index': i, 'aspect': tgt.ratio, 'stem': clip_stem, 'start': s, 'end': e,
+                                   'content': h.get('content', ''), 'crop_path': tgt.crop_path,
+                                   'ass': ass, 'srt': srt_path, 'title': ttl, 'audio_gain_db': gain,
+                                   'preview': outputs[-1]})
+            if srt_path:
+                deliver(srt_path)
+
+        logger(_format_timings(tier, timings, len(outputs)))
+        if tier == 'preview':
+            plan = {'source': path, 'aspect': aspects[0], 'aspects': aspects, 'crop_mode': crop_mode, 'platform': platform, 'watermark': wm_path,
+                    'out_prefix': out_pref, 'clips': plan_clips, 'timings': {tier: timings}}
+            plan_path = write_render_plan(plan, f"{out_pref}_plan.json")
+            logger(f"Render plan saved -> {plan_path}. Promote approved clips with promote_clips().")
+
         if export_srt and segs:
-            try:
-                srt_path = f"{out_pref}_{i}.srt"
-                write_srt_for_range(segs, srt_path, s, e)
-                srt_outputs.append(srt_path)
-            except Exception as ex:
-                logger(f"SRT export failed for clip {i}: {ex}")
-
-        cur = clip_path
-        if karaoke and segs:
-            ass = f"{out_pref}_{i}.ass"
-            res = (1080,1920) if aspect == '9:16' else (1920,1080)
-            write_ass_karaoke(segs, ass, s, e, res)
-            kara = f"{out_pref}_{i}_karaoke.mp4"
-            try:
-                burn_ass_to_video(cur, ass, kara)
-                cur = kara
-            except Exception as ex:
-                logger(f"Karaoke burn failed: {ex}")
-
-        ttl = titles[i-1] if i-1 < len(titles) else ''
-        if ttl:
-            ttl_out = f"{out_pref}_{i}_title.mp4"
-            try:
-                add_title_overlay(cur, ttl_out, ttl, platform)
-                cur = ttl_out
-            except Exception as ex:
-                logger(f"Title overlay failed: {ex}")
+            txt_path = os.path.join(os.path.dirname(out_pref), 'transcription.txt')
+            with open(txt_path,'w',encoding='utf-8') as f:
+                f.write(text)
+            deliver(txt_path)
 
-        if watermark_file is not None:
-            wm_out = f"{out_pref}_{i}_wm.mp4"
+        # Write SEO/description if provided
+        if seo_text:
             try:
-                add_watermark(cur, watermark_file.name, wm_out)
-                cur = wm_out
-            except Exception as ex:
-                logger(f"Watermark failed: {ex}")
+                with open(f"{out_pref}_description.txt", 'w', encoding='utf-8') as f:
+                    f.write(seo_text.strip() + "\n")
+                deliver(f"{out_pref}_description.txt")
+            except Exception:
+                pass
+    finally:
+        packager.close()
+    return zip_path
 
-        outputs.append(cur)
 
-    # Write SEO/description if provided
-    if seo_text:
-        try:
-            with open(f"{out_pref}_description.txt", 'w', encoding='utf-8') as f:
-                f.write(seo_text.strip() + "\n")
-        except Exception:
-            pass
+def promote_clips(plan_path: str, approved: Optional[List[int]] = None, logger=print, on_file=None) -> Optional[str]:
+    """Re-render approved preview clips at the final tier.
 
+    Reuses the crop path, ASS subtitles, SRTs and titles stored in the render plan,
+    so no face tracking, transcription or LLM calls are repeated.
+    """
+    plan = load_render_plan(plan_path)
+    clips = plan.get('clips', [])
+    if approved:
+        wanted = set(int(a) for a in approved)
+        clips = [c for c in clips if c['index'] in wanted]
+    if not clips:
+        logger('No approved clips to promote.')
+        return None
+
+    out_pref = plan.get('out_prefix') or 'short'
+    tier = 'final'
+    timings: Dict[str, float] = {}
     zip_path = f"{out_pref}_results.zip"
-    with zipfile.ZipFile(zip_path, 'w') as z:
-        for f in outputs:
-            if os.path.exists(f):
-                z.write(f)
-        # Add any SRTs generated per-clip
-        for srt in srt_outputs:
-            if os.path.exists(srt):
-                z.write(srt)
-        if export_srt and segs:
-            with open('transcription.txt','w',encoding='utf-8') as f:
-                f.write(text)
-            z.write('transcription.txt')
-        if seo_text and os.path.exists(f"{out_pref}_description.txt"):
-            z.write(f"{out_pref}_description.txt")
+    with ClipPackager(zip_path) as packager:
+        for c in clips:
+            _promote_one(plan, c, out_pref, tier, timings, packager, logger, on_file)
+
+    logger(_format_timings(tier, timings, len(clips)))
+    plan.setdefault('timings', {})[tier] = timings
+    write_render_plan(plan, plan_path)
     return zip_path
+
+
+def _promote_one(plan: Dict, c: Dict, out_pref: str, tier: str, timings: Dict[str, float], packager: ClipPackager,
+                 logger=print, on_file=None) -> None:
+    i, s, e = c['index'], float(c['start']), float(c['end'])
+    ratio = c.get('aspect') or plan['aspect']
+    stem = c.get('stem') or f"{out_pref}_{i}"
+    clip_path = f"{stem}.mp4"
+    crop_path = [tuple(p) for p in c['crop_path']] if c.get('crop_path') else None
+    logger(f"Promoting clip {i} ({tier}, {ratio}): {s:.2f}s to {e:.2f}s")
+    info = probe_video(plan['source'])
+    overlays = _overlays(info, ratio, tier, c.get('title', ''), plan.get('platform', 'TikTok'), plan.get('watermark'),
+                         logger)
+    with _timed(timings, 'render'):
+        render_crops(plan['source'], s, e, [CropTarget(clip_path, ratio, crop_path, None, overlays)], tier,
+                     info=info, audio_gain_db=c.get('audio_gain_db', 0.0))
+    out = _finish_clip(clip_path, stem, c.get('ass'), tier, timings, logger)
+    for f in [out] + ([c['srt']] if c.get('srt') else []):
+        if packager.add(f, os.path.basename(f)) and on_file is not None:
+            on_file((f, os.path.basename(f)))
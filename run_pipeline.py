@@ -2,7 +2,9 @@ import os
 import argparse
 from typing import Optional
 
-from pipeline_advanced import generate_pipeline
+from pipeline_advanced import generate_pipeline, promote_clips
+from encode_profiles import ENCODE_PROFILES, DEFAULT_TIER
+from trace_utils import enable_profiling, disable_profiling
 
 
 class NamedPath:
@@ -18,8 +20,12 @@ def parse_args():
     src = p.add_mutually_exclusive_group(required=True)
     src.add_argument("--youtube-url", type=str, help="YouTube video URL to download and process")
     src.add_argument("--video-file", type=str, help="Local video file path to process")
+    src.add_argument("--promote", type=str, metavar="PLAN_JSON",
+                     help="Re-render clips from a preview render plan at the final tier")
 
     p.add_argument("--srt-file", type=str, help="Optional SRT file to skip transcription and use its timing/text")
+    p.add_argument("--partial-download", action="store_true",
+                   help="YouTube only: fetch audio first, then only the video byte ranges covering the chosen highlights")
 
     p.add_argument("--provider", choices=["OpenAI", "Gemini"], default="OpenAI",
                    help="LLM provider to use for highlight selection and title generation")
@@ -32,8 +38,8 @@ def parse_args():
     p.add_argument("--max-len", type=float, default=60, help="Maximum clip length (seconds)")
     p.add_argument("--max-clips", type=int, default=5, help="Maximum number of clips to generate")
 
-    p.add_argument("--aspect", choices=["9:16", "16:9", "1:1"], default="9:16",
-                   help="Target aspect ratio for output clips")
+    p.add_argument("--aspect", choices=["9:16", "16:9", "1:1"], nargs="+", default=["9:16"],
+                   help="Target aspect ratio(s) for output clips; several ratios render from one decode")
     p.add_argument("--crop-mode", choices=["Center", "Face-track"], default="Center",
                    help="Cropping mode: simple center crop or face tracking where possible")
 
@@ -50,6 +56,18 @@ def parse_args():
 
     p.add_argument("--out-prefix", type=str, default="short", help="Prefix for output files")
 
+    p.add_argument("--tier", choices=list(ENCODE_PROFILES), default=DEFAULT_TIER,
+                   help="Encode tier: fast low-res 'preview' (writes a render plan) or full-quality 'final'")
+    p.add_argument("--approve", type=str, default="",
+                   help="Comma-separated clip numbers to promote with --promote (default: all)")
+
+    p.add_argument("--profile", action="store_true",
+                   help="Record per-stage wall/CPU time, peak RSS, frames and bytes to a JSON-lines file")
+    p.add_argument("--profile-out", type=str, default="",
+                   help="JSON-lines profile path (default: <out-prefix>_profile.jsonl)")
+    p.add_argument("--prometheus-out", type=str, default="",
+                   help="Also write per-stage totals in Prometheus text format to this path")
+
     seo = p.add_mutually_exclusive_group(required=False)
     seo.add_argument("--seo-text", type=str, default="", help="Optional SEO/description text to include in zip")
     seo.add_argument("--seo-text-file", type=str, help="Path to a text file with SEO/description content")
@@ -60,6 +78,26 @@ def parse_args():
 def main():
     args = parse_args()
 
+    if args.profile:
+        profile_out = args.profile_out or f"{args.out_prefix or 'short'}_profile.jsonl"
+        enable_profiling(profile_out, args.prometheus_out or None)
+        print(f"Profiling enabled -> {profile_out}")
+    try:
+        run(args)
+    finally:
+        disable_profiling()
+
+
+def run(args):
+    if args.promote:
+        approved = [int(x) for x in args.approve.split(",") if x.strip()]
+        zip_path = promote_clips(args.promote, approved or None, logger=print)
+        if zip_path:
+            print(f"Success! Final clips saved to: {zip_path}")
+        else:
+            print("Promotion did not produce results. Check logs above for details.")
+        return
+
     youtube_url = args.youtube_url or None
     video_file = NamedPath(args.video_file) if args.video_file else None
     srt_file = NamedPath(args.srt_file) if args.srt_file else None
@@ -95,6 +133,8 @@ def main():
         watermark_file=watermark_file,
         seo_text=seo_text,
         logger=print,
+        tier=args.tier,
+        partial_download=args.partial_download,
     )
 
     if zip_path:
@@ -2,6 +2,10 @@ import re
 import subprocess, shlex
 from typing import List, Dict, Tuple
 
+from encode_profiles import DEFAULT_TIER, ffmpeg_video_args, ffmpeg_audio_args
+from trace_utils import span
+from concurrency_utils import stage_slot
+
 # ---------- SRT / Text ----------
 
 def parse_srt_segments(path: str) -> List[Dict]:
@@ -139,6 +143,9 @@ def write_ass_karaoke(segs: List[Dict], path: str, t0: float, t1: float, resolut
         f.writelines(lines)
 
 
-def burn_ass_to_video(input_path: str, ass_path: str, output_path: str) -> None:
-    cmd = f"ffmpeg -y -i {shlex.quote(input_path)} -vf subtitles={shlex.quote(ass_path)} -c:a aac -c:v libx264 -pix_fmt yuv420p {shlex.quote(output_path)}"
-    subprocess.run(cmd, shell=True, check=True)
+def burn_ass_to_video(input_path: str, ass_path: str, output_path: str, tier: str = DEFAULT_TIER) -> None:
+    enc = ' '.join(shlex.quote(a) for a in ffmpeg_video_args(tier) + ffmpeg_audio_args(tier))
+    cmd = f"ffmpeg -y -i {shlex.quote(input_path)} -vf subtitles={shlex.quote(ass_path)} {enc} {shlex.quote(output_path)}"
+    with stage_slot('cpu'), span('burn_ass_to_video', tier=tier) as sp:
+        subprocess.run(cmd, shell=True, check=True)
+        sp.add_file_io(input_path, output_path)
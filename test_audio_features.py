@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming audio feature index (loudness, flux, VAD, silences)
+"""
+
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+
+from media_fixtures import ensure_ffmpeg_on_path
+from audio_features import (AudioIndex, RMS_DB, SPEECH_RATIO, VAD, build_audio_index, frame_features, read_pcm,
+                            voice_activity)
+
+
+def make_bursts(path: str) -> str:
+    """8 s of 440 Hz tone bursts: quiet 0-2 s, silence 2-3 s, loud 3-5 s, silence 5-6 s, quiet 6-8 s."""
+    expr = "sin(2*PI*440*t)*(0.05*between(t,0,2)+0.5*between(t,3,5)+0.05*between(t,6,8))"
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f"aevalsrc='{expr}':s=16000:d=8",
+                    '-c:a', 'aac', path], check=True)
+    return path
+
+
+def test_silences_loudness_and_cache():
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        src = make_bursts(os.path.join(d, 'bursts.m4a'))
+        idx = build_audio_index(src, root=os.path.join(d, 'audio'))
+        assert abs(idx.duration - 8.0) < 0.1
+        assert isinstance(idx.feats, np.memmap)
+
+        gaps = [(a, b) for a, b in idx.silences(min_len=0.3) if 0.5 < a < 7.5]
+        assert len(gaps) == 2
+        for (a, b), (ea, eb) in zip(gaps, [(2, 3), (5, 6)]):
+            assert abs(a - ea) < 0.2 and abs(b - eb) < 0.2
+
+        assert idx.loudness_db(3, 5) - idx.loudness_db(0, 2) > 15
+        assert idx.gain_to_target(0, 2) > idx.gain_to_target(3, 5)
+        assert abs(idx.gain_to_target(2.2, 2.8)) == 0.0
+        assert any(3 <= p <= 5 for p in idx.peaks(top=2, min_gap=2.0))
+
+        again = build_audio_index(src, root=os.path.join(d, 'audio'))
+        assert np.array_equal(np.asarray(again.feats), np.asarray(idx.feats))
+
+
+def test_block_size_does_not_change_features():
+    """Frames straddling read blocks are carried over, so the result is the same for any block size"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        src = make_bursts(os.path.join(d, 'bursts.m4a'))
+        whole = frame_features(read_pcm(src, block=1 << 20))
+        chunked = frame_features(read_pcm(src, block=1234))
+        assert whole.shape == chunked.shape
+        assert np.allclose(whole, chunked, atol=1e-3)
+
+
+def test_vad_bridges_short_gaps():
+    feats = np.zeros((100, 4), np.float32)
+    feats[:, RMS_DB] = -80
+    feats[10:40, RMS_DB] = feats[45:70, RMS_DB] = -20
+    feats[:, SPEECH_RATIO] = 0.9
+    feats[:, VAD] = voice_activity(feats, hangover=15)
+    vad = feats[:, VAD] > 0.5
+    assert vad[10:70].all() and not vad[:3].any() and not vad[80:].any()
+    gaps = AudioIndex(feats).silences(min_len=0.01)
+    assert [(round(a, 2), round(b, 2)) for a, b in gaps] == [(0.0, 0.03), (0.77, 1.0)]
+    assert len(AudioIndex(feats).silences(min_len=0.1)) == 1
+
+
+if __name__ == "__main__":
+    test_silences_loudness_and_cache()
+    test_block_size_does_not_change_features()
+    test_vad_bridges_short_gaps()
+    print("✓ Audio feature tests passed")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the synthetic-media benchmark harness and baseline comparison
+"""
+
+import json
+import os
+import tempfile
+
+from benchmark import compare_results, mock_provider, run_benchmark
+from media_fixtures import fixtures
+from llm_utils import generate_titles_from_highlights, pick_highlights, register_provider
+
+
+def test_mock_provider_drives_llm_utils():
+    """The mocked provider goes through the normal highlight/title parsing"""
+    register_provider('Mock', mock_provider(30, 10))
+    highs = pick_highlights('some words', 'Mock', 'mock', 5, 5, 15)
+    assert [(h['start'], h['end']) for h in highs] == [(0, 10), (10, 20), (20, 30)]
+    assert len(generate_titles_from_highlights(highs, 'Mock', 'mock')) == 3
+
+
+def test_fixtures_and_stage_results():
+    """Synthetic media is generated once and every requested stage reports timings"""
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        assert os.path.getsize(fx['video']) > 0 and os.path.getsize(fx['srt']) > 0
+        mtime = os.path.getmtime(fx['video'])
+        res = run_benchmark(['tiny'], tier='preview', repeat=2,
+                            stages=['srt_parse', 'subtitles', 'llm', 'packaging'], media_dir=d, logger=lambda m: None)
+        assert os.path.getmtime(fx['video']) == mtime
+        stages = res['sizes']['tiny']['stages']
+        assert set(stages) == {'srt_parse', 'subtitles', 'llm', 'packaging'}
+        for m in stages.values():
+            assert 'error' not in m and len(m['runs']) == 2 and m['wall_s'] >= 0
+        assert stages['packaging']['bytes_written'] > 0
+        json.dumps(res)
+
+
+def test_compare_results_flags_regressions():
+    """Only slowdowns beyond the tolerance and the noise floor count"""
+    base = {'sizes': {'small': {'stages': {'face_track': {'wall_s': 2.0}, 'llm': {'wall_s': 0.001},
+                                           'crop_render': {'error': 'x'}}}}}
+    cur = {'sizes': {'small': {'stages': {'face_track': {'wall_s': 3.0}, 'llm': {'wall_s': 0.004},
+                                          'crop_render': {'wall_s': 9.0}}}}}
+    regs = compare_results(cur, base, tolerance=0.25)
+    assert [(r['size'], r['stage']) for r in regs] == [('small', 'face_track')]
+    assert regs[0]['ratio'] == 1.5
+
+
+if __name__ == "__main__":
+    test_mock_provider_drives_llm_utils()
+    test_fixtures_and_stage_results()
+    test_compare_results_flags_regressions()
+    print("✓ Benchmark tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for snapping highlight boundaries to sentence, pause and silence edges
+"""
+
+import time
+
+from boundary_utils import BoundaryIndex, dedupe_highlights, refine_highlights
+from subs_utils import words_from_segs
+
+
+def _segs():
+    # Three sentences; a 1 s pause after the first, words back to back otherwise.
+    return words_from_segs([
+        {'start': 0.0, 'end': 3.0, 'text': 'This is the first sentence.'},
+        {'start': 4.0, 'end': 7.0, 'text': 'Here comes the second one!'},
+        {'start': 7.0, 'end': 12.0, 'text': 'And then a third sentence that runs on for a while.'},
+    ])
+
+
+def test_snaps_to_sentence_edges_not_mid_word():
+    idx = BoundaryIndex(_segs())
+    # 4.3 s is inside "Here"; the start moves back to the sentence start (minus padding).
+    assert 3.8 <= idx.snap_start(4.3) <= 4.0
+    # 6.4 s is mid-sentence; the end moves to just after the "!" at 7.0 s.
+    assert idx.snap_end(6.4) == 7.0
+    # Nothing within the tolerance: the time is kept.
+    assert idx.snap_end(30.0) == 30.0
+
+
+def test_silences_are_cut_points():
+    segs = [{'start': 0.0, 'end': 20.0, 'text': 'one long run on segment without any punctuation at all'}]
+    idx = BoundaryIndex(words_from_segs(segs), silences=[(9.5, 10.5)])
+    assert idx.snap_end(10.2) == 9.65
+    assert idx.snap_start(9.9) == 10.35
+
+
+def test_lengths_are_fitted_instead_of_dropped():
+    segs = _segs()
+    short = refine_highlights([{'start': 4.2, 'end': 5.0, 'content': 'too short'}], segs, 3, 8, duration=12.0)[0]
+    assert short['start'] <= 4.0 and short['end'] == 7.0 and short['llm_start'] == 4.2
+    long = refine_highlights([{'start': 0.1, 'end': 11.8, 'content': 'too long'}], segs, 3, 8, duration=12.0)[0]
+    assert long['start'] == 0.0 and 3 <= long['end'] <= 8.0
+    # A clip at the very end is extended backwards rather than past the source.
+    tail = refine_highlights([{'start': 11.5, 'end': 12.0}], segs, min_len=3, max_len=8, duration=12.0)[0]
+    assert tail['end'] <= 12.0 and tail['end'] - tail['start'] >= 3
+    # A start past the end of the source (or an inverted range) stays inside it.
+    for s, e in ((14.0, 15.0), (11.0, 10.0)):
+        past = refine_highlights([{'start': s, 'end': e}], segs, min_len=3, max_len=8, duration=12.0)[0]
+        assert 0 <= past['start'] and past['end'] <= 12.0 and past['end'] - past['start'] >= 3
+    assert BoundaryIndex(segs, duration=2.0).refine(5.0, 6.0, 3, 8) == (0.0, 2.0)
+
+
+def test_overlapping_highlights_are_deduped():
+    highs = [{'start': 0, 'end': 10}, {'start': 2, 'end': 11}, {'start': 9, 'end': 20}, {'start': 30, 'end': 40}]
+    assert [(h['start'], h['end']) for h in dedupe_highlights(highs)] == [(0, 10), (9, 20), (30, 40)]
+
+
+def test_refinement_is_cheap_on_long_transcripts():
+    segs = words_from_segs([{'start': i * 3.0, 'end': i * 3.0 + 2.5, 'text': 'a few words here.'}
+                            for i in range(20000)])
+    idx = BoundaryIndex(segs)
+    t = time.perf_counter()
+    for k in range(1000):
+        idx.refine(k * 37.3, k * 37.3 + 25.0, 15, 60)
+    assert (time.perf_counter() - t) / 1000 < 0.001
+
+
+if __name__ == "__main__":
+    test_snaps_to_sentence_edges_not_mid_word()
+    test_silences_are_cut_points()
+    test_lengths_are_fitted_instead_of_dropped()
+    test_overlapping_highlights_are_deduped()
+    test_refinement_is_cheap_on_long_transcripts()
+    print("✓ Boundary refinement tests passed")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the ranged downloader and source cache against a local HTTP file server
+"""
+
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from download_utils import SourceCache, StreamInfo, fetch_ranged, start_source_download
+
+FILES = {
+    '/video.mp4': os.urandom(300_000),
+    '/audio.mp4': os.urandom(50_000),
+}
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves FILES with optional Range support; records every request."""
+    ranges = True
+    requests = []
+
+    def do_GET(self):
+        data = FILES.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        rng = self.headers.get('Range')
+        type(self).requests.append((self.path, rng))
+        if rng and self.ranges:
+            a, b = rng.replace('bytes=', '').split('-')
+            a, b = int(a), min(int(b), len(data) - 1)
+            body = data[a:b + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {a}-{b}/{len(data)}')
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class NoRangeHandler(RangeHandler):
+    ranges = False
+    requests = []
+
+
+def _serve(handler):
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f'http://127.0.0.1:{srv.server_address[1]}'
+
+
+def test_fetch_ranged_parallel_chunks():
+    """File is reassembled correctly from many parallel range requests"""
+    RangeHandler.requests = []
+    srv, base = _serve(RangeHandler)
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            dest = fetch_ranged(base + '/video.mp4', os.path.join(d, 'v.mp4'), chunk_size=32_000, workers=4)
+            with open(dest, 'rb') as f:
+                assert f.read() == FILES['/video.mp4']
+            assert os.listdir(d) == ['v.mp4']
+        # probe + ceil(300000 / 32000) chunks
+        assert len(RangeHandler.requests) == 1 + 10
+    finally:
+        srv.shutdown()
+
+
+def test_fetch_without_range_support():
+    """Servers that ignore Range still produce a complete file"""
+    srv, base = _serve(NoRangeHandler)
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            dest = fetch_ranged(base + '/audio.mp4', os.path.join(d, 'a.mp4'), chunk_size=8_000)
+            with open(dest, 'rb') as f:
+                assert f.read() == FILES['/audio.mp4']
+    finally:
+        srv.shutdown()
+
+
+def test_source_cache_reuses_downloads():
+    """Second download of the same video id/itag is served from disk"""
+    RangeHandler.requests = []
+    srv, base = _serve(RangeHandler)
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            cache = SourceCache(d)
+            audio = StreamInfo(140, base + '/audio.mp4', len(FILES['/audio.mp4']), 'mp4', True)
+            video = StreamInfo(18, base + '/video.mp4', len(FILES['/video.mp4']), 'mp4', True)
+
+            src = start_source_download('abc123', audio, video, cache, logger=lambda m: None, chunk_size=64_000)
+            apath = src.audio_path(timeout=30)
+            vpath = src.video_path(timeout=30)
+            assert apath == cache.path_for('abc123', 140)
+            assert vpath == cache.path_for('abc123', 18)
+            with open(vpath, 'rb') as f:
+                assert f.read() == FILES['/video.mp4']
+            # Audio is requested before any video byte range
+            assert RangeHandler.requests[0][0] == '/audio.mp4'
+
+            n = len(RangeHandler.requests)
+            src = start_source_download('abc123', audio, video, cache, logger=lambda m: None)
+            assert src.video_path(timeout=30) == vpath
+            assert len(RangeHandler.requests) == n
+    finally:
+        srv.shutdown()
+
+
+def test_concurrent_fetches_share_one_download():
+    """Separate SourceCache instances fetching the same stream download it once, intact"""
+    RangeHandler.requests = []
+    srv, base = _serve(RangeHandler)
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            video = StreamInfo(18, base + '/video.mp4', len(FILES['/video.mp4']), 'mp4', True)
+            paths, errors = [], []
+
+            def job():
+                try:
+                    paths.append(SourceCache(d).fetch('xyz', video, logger=lambda m: None, chunk_size=16_000))
+                except Exception as ex:
+                    errors.append(ex)
+
+            threads = [threading.Thread(target=job) for _ in range(4)]
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            assert not errors and len(set(paths)) == 1
+            with open(paths[0], 'rb') as f:
+                assert f.read() == FILES['/video.mp4']
+            assert os.listdir(d) == ['xyz_18.mp4']
+        # probe + ceil(300000 / 16000) chunks, once
+        assert len(RangeHandler.requests) == 1 + 19
+    finally:
+        srv.shutdown()
+
+
+if __name__ == "__main__":
+    test_fetch_ranged_parallel_chunks()
+    test_fetch_without_range_support()
+    test_source_cache_reuses_downloads()
+    test_concurrent_fetches_share_one_download()
+    print("✓ Download tests passed")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk per-source face-track store
+"""
+
+import os
+import tempfile
+import threading
+
+from media_fixtures import ensure_ffmpeg_on_path, fixtures
+from download_utils import source_hash
+from face_store import FaceTrackStore
+from video_utils import crop_path_from_centers
+
+
+def test_only_missing_samples_are_analysed():
+    """Overlapping clips and reruns reuse samples already on disk"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        root = os.path.join(d, 'faces')
+        store = FaceTrackStore(fx['video'], sample_fps=4.0, root=root)
+        assert store.missing_ranges(0, 2) == [(0, 8)]
+        assert store.ensure(0, 2) == 8
+        assert store.missing_ranges(1, 3) == [(8, 12)]
+        assert store.ensure(1, 3) == 4
+        assert store.ensure(0.5, 2.5) == 0
+
+        boxes = store.boxes_between(1, 3)
+        assert [t for t, _ in boxes] == [k / 4 for k in range(8)]
+        assert any(b is not None for _, b in boxes)
+
+        rerun = FaceTrackStore(fx['video'], sample_fps=4.0, root=root)
+        assert rerun.ensure(0, 3) == 0
+        centers = rerun.centers(0, 3)
+        assert centers == store.centers(0, 3)
+        for ratio in ('9:16', '1:1'):
+            assert len(crop_path_from_centers(centers, 320, 180, ratio)) == 12
+
+
+def test_concurrent_stores_analyse_once():
+    """Two stores for one source (e.g. two jobs) share the cache file without racing on it"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        root = os.path.join(d, 'faces')
+        stores = [FaceTrackStore(fx['video'], sample_fps=4.0, root=root) for _ in range(2)]
+        counts = []
+        threads = [threading.Thread(target=lambda s=s: counts.append(s.ensure(0, 2))) for s in stores]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        assert sorted(counts) == [0, 8]
+        assert stores[0].centers(0, 2) == stores[1].centers(0, 2)
+        assert os.listdir(root) == [os.path.basename(stores[0].cache_path)]
+
+
+def test_source_hash_tracks_content():
+    with tempfile.TemporaryDirectory() as d:
+        p = os.path.join(d, 'v.bin')
+        with open(p, 'wb') as f:
+            f.write(b'a' * 3_000_000)
+        h1 = source_hash(p)
+        with open(p, 'r+b') as f:
+            f.seek(2_999_999)
+            f.write(b'b')
+        assert source_hash(p) != h1
+
+
+if __name__ == "__main__":
+    test_only_missing_samples_are_analysed()
+    test_concurrent_stores_analyse_once()
+    test_source_hash_tracks_content()
+    print("✓ Face store tests passed")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for the threaded decode -> crop -> encode frame pipeline
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+from media_fixtures import ensure_ffmpeg_on_path, fixtures
+from frame_pipeline import (BufferPool, CropTarget, Overlay, _Stopped, probe_video, read_frames, read_frames_pooled,
+                            render_crops)
+from trace_utils import disable_profiling, enable_profiling
+from video_utils import (crop_center, crop_face_track, plan_geometry, target_size, title_overlay,
+                         watermark_overlay)
+
+
+def test_buffer_pool_blocks_and_shares():
+    pool = BufferPool((2, 2, 3), 2)
+    a, b = pool.get(), pool.get()
+    stop = threading.Event()
+    threading.Timer(0.3, stop.set).start()
+    try:
+        pool.get(stop)
+        assert False, "an exhausted pool must block until a buffer is returned"
+    except _Stopped:
+        pass
+    pool.share(a, 2)
+    pool.release(a)
+    pool.put(b)
+    assert pool.get() is b
+    pool.release(a)
+    assert pool.get() is a
+
+
+def test_pooled_reader_matches_plain_reader():
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        info = probe_video(fx['video'])
+        pool = BufferPool((info.height, info.width, 3), 3)
+        plain = list(read_frames(fx['video'], 0.5, 1.5, info=info))
+        seen = set()
+        for (t, frame), (pt, pframe) in zip(read_frames_pooled(fx['video'], 0.5, 1.5, pool, info), plain):
+            assert t == pt and np.array_equal(frame, pframe)
+            seen.add(id(frame))
+            pool.put(frame)
+        assert len(seen) <= 3
+
+
+def test_crop_entry_points_use_the_pipeline():
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        center = crop_center(fx['video'], os.path.join(d, 'center.mp4'), '9:16', 0, 2, tier='preview')
+        face = crop_face_track(fx['video'], os.path.join(d, 'face.mp4'), '1:1', 1, 3, size=(180, 180))
+        a, b = probe_video(center), probe_video(face)
+        assert target_size('9:16', 'preview') == (270, 480)
+        assert (a.width, a.height) == (100, 180)
+        assert abs(a.duration - 2) < 0.2
+        assert (b.width, b.height) == (180, 180) and abs(b.duration - 2) < 0.2
+
+
+def test_geometry_scales_once_and_never_up_by_default():
+    # Crops below the platform size are kept rather than upscaled; larger ones scale down.
+    assert plan_geometry(320, 180, '9:16', 'final').identity
+    assert str(plan_geometry(320, 180, '1:1', 'preview')) == '180x180->180x180'
+    assert str(plan_geometry(1920, 1080, '1:1', 'preview')) == '1080x1080->480x480'
+    assert str(plan_geometry(3840, 2160, '9:16', 'final')) == '1214x2160->1080x1920'
+    assert plan_geometry(320, 180, '16:9', size=(320, 180)).identity
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        targets = [CropTarget(os.path.join(d, 'same.mp4'), '16:9', None, (320, 180)),
+                   CropTarget(os.path.join(d, 'up.mp4'), '9:16', None, (200, 360))]
+        tracer = enable_profiling()
+        try:
+            outs = render_crops(fx['video'], 0, 1, targets, 'preview')
+        finally:
+            disable_profiling()
+        rec = [r for r in tracer.records if r['name'] == 'render_crops'][0]
+        assert rec['geometry'] == ['320x180->320x180', '100x180->200x360']
+        # The full-frame identity output is passed through without a crop copy.
+        assert rec['crop_us_per_frame'][0] == 0 and rec['crop_us_per_frame'][1] > 0
+        assert all(v > 0 for v in rec['encode_us_per_frame'])
+        assert [(probe_video(o).width, probe_video(o).height) for o in outs] == [(320, 180), (200, 360)]
+        assert rec['bytes_written'] == sum(os.path.getsize(o) for o in outs)
+
+
+def _lavfi(path, video, audio=None):
+    """Encode a lavfi video source (plus an optional audio source) for the edge-case tests."""
+    cmd = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', video]
+    if audio:
+        cmd += ['-f', 'lavfi', '-i', audio]
+    subprocess.run(cmd + ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-fps_mode', 'vfr',
+                          path], check=True)
+    return path
+
+
+def test_clip_past_end_of_audio_is_padded():
+    """6 s of audio under 10 s of video: a 4-9 s clip keeps its full length instead of breaking the pipe"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        src = _lavfi(os.path.join(d, 'short_audio.mp4'), 'testsrc=size=160x90:rate=25:duration=10',
+                     'sine=frequency=440:duration=6')
+        out, = render_crops(src, 4, 9, [CropTarget(os.path.join(d, 'out.mp4'), '1:1', None)], 'preview',
+                            audio_gain_db=3.0)
+        info = probe_video(out)
+        assert info.has_audio and abs(info.duration - 5) < 0.2
+
+
+def test_variable_frame_rate_source():
+    """Frames are decoded at the probed rate, so a VFR source gives as many frames as the encoder expects"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        # Every third frame dropped in the first half: 25 fps there, ~16.7 fps after.
+        src = _lavfi(os.path.join(d, 'vfr.mp4'),
+                     "testsrc=size=160x90:rate=25:duration=6,select='lt(t\\,3)+not(eq(mod(n\\,3)\\,2))'",
+                     'sine=frequency=440:duration=6')
+        info = probe_video(src)
+        frames = list(read_frames(src, 1, 5, info=info))
+        assert abs(len(frames) - 4 * info.fps) <= 2
+        out, = render_crops(src, 1, 5, [CropTarget(os.path.join(d, 'out.mp4'), '9:16', None)], 'preview', info)
+        assert abs(probe_video(out).duration - 4) < 0.2
+
+
+def test_decoder_failure_is_raised():
+    """A truncated source fails the render instead of silently producing a short or empty clip"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        info = probe_video(fx['video'])
+        broken = os.path.join(d, 'truncated.mp4')
+        with open(fx['video'], 'rb') as f, open(broken, 'wb') as g:
+            g.write(f.read()[:os.path.getsize(fx['video']) // 2])
+        try:
+            render_crops(broken, 0, 2, [CropTarget(os.path.join(d, 'out.mp4'), '1:1', None)], 'preview', info)
+            assert False, "expected the decoder failure to surface"
+        except RuntimeError as ex:
+            assert 'decoder' in str(ex)
+
+
+def test_encoder_failure_does_not_hang():
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        bad = os.path.join(d, 'missing_dir', 'out.mp4')
+        try:
+            render_crops(fx['video'], 0, 4, [CropTarget(bad, '9:16', None),
+                                             CropTarget(os.path.join(d, 'ok.mp4'), '1:1', None)], depth=2)
+            assert False, "expected the failed encoder to surface"
+        except (RuntimeError, OSError):
+            pass
+
+
+def _first_frame(path):
+    return next(read_frames(path, 0, 0.2, info=probe_video(path)))[1].astype(int)
+
+
+def test_overlays_are_blended_in_the_crop_stage():
+    """Title card and watermark are composited while cropping; pixels change only under the sprites"""
+    frame = np.full((4, 4, 3), 100, np.uint8)
+    rgba = np.zeros((4, 4, 4), np.uint8)
+    rgba[1, 1] = (255, 0, 0, 255)
+    rgba[2, 2] = (0, 0, 200, 128)
+    ov = Overlay(rgba)
+    assert (ov.x, ov.y, ov.w, ov.h) == (1, 1, 2, 2)
+    ov.apply(frame)
+    assert frame[1, 1].tolist() == [255, 0, 0] and frame[2, 2].tolist() == [50, 50, 150]
+    assert frame[0, 0].tolist() == frame[1, 2].tolist() == [100, 100, 100]
+
+    ensure_ffmpeg_on_path()
+    from PIL import Image
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        logo = os.path.join(d, 'logo.png')
+        Image.new('RGB', (20, 10), (255, 0, 0)).save(logo)
+        # 16:9 of the 320x180 source is the whole frame: overlays must not be drawn into the shared decode buffer.
+        geo = plan_geometry(320, 180, '16:9', 'preview')
+        overlays = [title_overlay('HELLO', geo), watermark_overlay(logo, geo)]
+        plain, marked, other = render_crops(fx['video'], 0, 1, [
+            CropTarget(os.path.join(d, 'plain.mp4'), '16:9', None),
+            CropTarget(os.path.join(d, 'marked.mp4'), '16:9', None, None, overlays),
+            CropTarget(os.path.join(d, 'other.mp4'), '16:9', None)], 'preview')
+        a, b, c = _first_frame(plain), _first_frame(marked), _first_frame(other)
+        assert np.array_equal(a, c)
+        wm = b[4:44, 320 - 96 + 4:316]
+        assert wm[..., 0].min() > 200 and wm[..., 1:].max() < 60
+        assert np.abs(b[18:50, 100:220] - a[18:50, 100:220]).max() > 100
+        assert np.abs(b[100:] - a[100:]).mean() < 3
+
+
+if __name__ == "__main__":
+    test_buffer_pool_blocks_and_shares()
+    test_pooled_reader_matches_plain_reader()
+    test_crop_entry_points_use_the_pipeline()
+    test_geometry_scales_once_and_never_up_by_default()
+    test_clip_past_end_of_audio_is_padded()
+    test_variable_frame_rate_source()
+    test_decoder_failure_is_raised()
+    test_encoder_failure_does_not_hang()
+    test_overlays_are_blended_in_the_crop_stage()
+    print("✓ Frame pipeline tests passed")
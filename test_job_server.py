@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Tests for the job server: persistent queue, stage concurrency limits and progress events
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from concurrency_utils import set_stage_limits, stage_slot
+from job_server import JobServer, JobStore, make_http_server
+
+
+class FakeRunner:
+    """Stands in for generate_pipeline: one 'render' stage, then a ZIP in the job directory."""
+
+    def __init__(self, render_s=0.2):
+        self.render_s = render_s
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.keys = []
+
+    def __call__(self, params, out_prefix, logger):
+        self.keys.append(params.get('openai_key'))
+        logger('plain log line')
+        logger.event('render', 'Rendering clip 1', clip=1, clips=1)
+        with stage_slot('cpu'):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(self.render_s)
+            with self.lock:
+                self.active -= 1
+        zip_path = f"{out_prefix}_results.zip"
+        with zipfile.ZipFile(zip_path, 'w') as z:
+            z.writestr('clip.txt', params['video_file'])
+        return zip_path
+
+
+def _wait_all(store, ids, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(store.get(i)['status'] in ('done', 'failed') for i in ids):
+            return
+        time.sleep(0.05)
+    raise AssertionError('jobs did not finish')
+
+
+def test_cpu_slots_bound_render_stages():
+    """Three workers run jobs at once but only one holds the cpu slot"""
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'in.mp4')
+        open(src, 'wb').close()
+        runner = FakeRunner()
+        jobs = JobServer(d, workers=3, cpu_slots=1, io_slots=2, runner=runner).start()
+        try:
+            ids = [jobs.submit({'video_file': src}) for _ in range(3)]
+            _wait_all(jobs.store, ids)
+        finally:
+            jobs.stop(5)
+            set_stage_limits()
+        assert runner.peak == 1
+        for i in ids:
+            stages = [e['stage'] for e in jobs.store.events(i)]
+            assert stages == ['queued', 'started', 'log', 'render', 'done']
+            assert jobs.store.events(i)[3]['data'] == {'clip': 1, 'clips': 1}
+
+
+def test_queue_survives_restart():
+    """Jobs left running by a dead process are re-queued and completed"""
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'in.mp4')
+        open(src, 'wb').close()
+        store = JobStore(os.path.join(d, 'jobs.db'))
+        job_id = store.submit(dict(video_file=src, out_prefix='short'))
+        assert store.claim()['id'] == job_id
+        del store
+        jobs = JobServer(d, workers=1, runner=FakeRunner(0)).start()
+        try:
+            _wait_all(jobs.store, [job_id])
+        finally:
+            jobs.stop(5)
+            set_stage_limits()
+        assert jobs.store.get(job_id)['status'] == 'done'
+        assert 'requeued' in [e['stage'] for e in jobs.store.events(job_id)]
+
+
+def test_http_api():
+    """Submit, stream progress, fetch the ZIP; bad options are rejected"""
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'in.mp4')
+        open(src, 'wb').close()
+        runner = FakeRunner(0.1)
+        jobs = JobServer(d, workers=1, runner=runner).start()
+        srv = make_http_server(jobs, port=0)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{srv.server_address[1]}'
+
+        def post(body):
+            req = Request(base + '/jobs', json.dumps(body).encode(), {'Content-Type': 'application/json'})
+            with urlopen(req) as r:
+                return r.status, json.loads(r.read())
+
+        try:
+            try:
+                post({'video_file': src, 'bogus': 1})
+                assert False, 'expected 400'
+            except HTTPError as ex:
+                assert ex.code == 400
+
+            status, body = post({'video_file': src, 'openai_key': 'sk-secret'})
+            assert status == 201
+            job_id = body['id']
+            with urlopen(f'{base}/jobs/{job_id}/stream') as r:
+                assert r.headers['Content-Type'] == 'text/event-stream'
+                stream = r.read().decode()
+            names = [l.split(': ', 1)[1] for l in stream.splitlines() if l.startswith('event: ')]
+            assert names[-1] == 'done' and 'render' in names
+
+            with urlopen(f'{base}/jobs/{job_id}/events?after=2') as r:
+                evs = json.loads(r.read())
+            assert evs['status'] == 'done' and evs['events'][0]['seq'] == 3
+            for bad in ('after=x', 'wait=soon', 'after=-1', 'wait=nan'):
+                try:
+                    urlopen(f'{base}/jobs/{job_id}/events?{bad}')
+                    assert False, f'expected 400 for {bad}'
+                except HTTPError as ex:
+                    assert ex.code == 400
+            with urlopen(f'{base}/jobs/{job_id}') as r:
+                job = json.loads(r.read())
+            assert 'openai_key' not in job['params'] and job['result'] is True
+            # The key reaches the runner but is never written to the job database.
+            assert runner.keys == ['sk-secret']
+            with open(os.path.join(d, 'jobs.db'), 'rb') as f:
+                assert b'sk-secret' not in f.read()
+            with urlopen(f'{base}/jobs/{job_id}/result') as r:
+                path = os.path.join(d, 'got.zip')
+                with open(path, 'wb') as f:
+                    f.write(r.read())
+            with zipfile.ZipFile(path) as z:
+                assert z.read('clip.txt').decode() == src
+        finally:
+            srv.shutdown()
+            jobs.stop(5)
+            set_stage_limits()
+
+
+class StreamingRunner(FakeRunner):
+    """Delivers one clip, then holds the job open until released."""
+
+    def __init__(self):
+        super().__init__(0)
+        self.release = threading.Event()
+
+    def __call__(self, params, out_prefix, logger):
+        first = f"{out_prefix}_1.mp4"
+        with open(first, 'wb') as f:
+            f.write(os.urandom(200_000))
+        logger.file((first, os.path.basename(first)))
+        self.release.wait(20)
+        second = f"{out_prefix}_2.mp4"
+        with open(second, 'wb') as f:
+            f.write(os.urandom(1000))
+        logger.file((second, os.path.basename(second)))
+        return super().__call__(params, out_prefix, logger)
+
+
+def test_result_streams_while_job_runs():
+    """/result starts sending the first clip before the job has finished"""
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'in.mp4')
+        open(src, 'wb').close()
+        runner = StreamingRunner()
+        jobs = JobServer(d, workers=1, runner=runner).start()
+        srv = make_http_server(jobs, port=0)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{srv.server_address[1]}'
+        try:
+            job_id = jobs.submit({'video_file': src})
+            while 'file' not in [e['stage'] for e in jobs.store.events(job_id)]:
+                time.sleep(0.05)
+            with urlopen(f'{base}/jobs/{job_id}/result') as r:
+                head = r.read(4)
+                assert head == b'PK\x03\x04' and jobs.store.get(job_id)['status'] == 'running'
+                runner.release.set()
+                data = head + r.read()
+            path = os.path.join(d, 'streamed.zip')
+            with open(path, 'wb') as f:
+                f.write(data)
+            with zipfile.ZipFile(path) as z:
+                assert z.namelist() == ['short_1.mp4', 'short_2.mp4'] and z.testzip() is None
+        finally:
+            runner.release.set()
+            srv.shutdown()
+            jobs.stop(5)
+            set_stage_limits()
+
+
+class RecordingRunner(FakeRunner):
+    """FakeRunner that keeps each job's params (promotion jobs have no video_file)."""
+
+    def __init__(self, render_s=0.2):
+        super().__init__(render_s)
+        self.params = []
+
+    def __call__(self, params, out_prefix, logger):
+        self.params.append(params)
+        return super().__call__(dict(params, video_file=params['video_file'] or 'promoted'), out_prefix, logger)
+
+
+def test_follow_streams_events_and_promote_jobs():
+    """follow() yields events as they arrive until the job ends; promotion jobs go through the same queue"""
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'in.mp4')
+        plan = os.path.join(d, 'short_plan.json')
+        for p in (src, plan):
+            open(p, 'wb').close()
+        runner = RecordingRunner(render_s=0.5)
+        jobs = JobServer(d, workers=1, runner=runner).start()
+        try:
+            batches = list(jobs.follow(jobs.submit({'video_file': src}), poll=0.1))
+            promote_id = jobs.submit({'promote_plan': plan, 'approve': [2]})
+            list(jobs.follow(promote_id, poll=0.1))
+            try:
+                jobs.submit({'approve': [1]})
+                assert False, "expected a job without a source or plan to be rejected"
+            except ValueError as ex:
+                assert 'promote_plan' in str(ex)
+        finally:
+            jobs.stop(5)
+            set_stage_limits()
+        assert len(batches) >= 2
+        assert [e['stage'] for b in batches for e in b] == ['queued', 'started', 'log', 'render', 'done']
+        assert batches[-1][-1]['stage'] == 'done'
+        assert jobs.store.get(promote_id)['status'] == 'done'
+        assert runner.params[1]['promote_plan'] == plan and runner.params[1]['approve'] == [2]
+
+
+if __name__ == "__main__":
+    test_cpu_slots_bound_render_stages()
+    test_queue_survives_restart()
+    test_http_api()
+    test_result_streams_while_job_runs()
+    test_follow_streams_events_and_promote_jobs()
+    print("✓ Job server tests passed")
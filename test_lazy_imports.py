@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regression tests: `--help` and SRT-only runs must not load torch, OpenCV or Whisper
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FORBIDDEN = ('torch', 'cv2', 'faster_whisper', 'whisper', 'ctranslate2')
+
+
+def _loaded_after(code: str) -> list:
+    """Run code in a fresh interpreter and return the forbidden modules it left in sys.modules.
+
+    The interpreter runs in a scratch directory, so caches (videos/cache/...) stay out of the checkout.
+    """
+    probe = code + f"\nimport json, sys\nprint(json.dumps(sorted(m for m in {FORBIDDEN!r} if m in sys.modules)))\n"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory() as cwd:
+        r = subprocess.run([sys.executable, '-c', probe], cwd=cwd, env=env, capture_output=True, text=True,
+                           timeout=120)
+    assert r.returncode == 0, r.stderr
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def test_help_is_lightweight():
+    """run_pipeline.py --help parses arguments without importing any heavy stage"""
+    script = os.path.join(HERE, 'run_pipeline.py')
+    code = ("import runpy, sys\nsys.argv = ['run_pipeline.py', '--help']\n"
+            f"try:\n    runpy.run_path({script!r}, run_name='__main__')\nexcept SystemExit:\n    pass\n")
+    assert _loaded_after(code) == []
+    assert _loaded_after('import run_pipeline, pipeline_advanced, llm_utils, video_utils, job_server') == []
+    # Test helpers too: the synthetic-media fixtures only need OpenCV to draw a new face image.
+    assert _loaded_after('import media_fixtures, benchmark') == []
+
+
+def test_srt_only_pipeline_skips_vision_and_asr():
+    """With an SRT and center crop, transcription and face detection modules stay unloaded"""
+    from media_fixtures import ensure_ffmpeg_on_path, fixtures
+    with tempfile.TemporaryDirectory() as d:
+        ensure_ffmpeg_on_path()
+        fx = fixtures('tiny', d)
+        code = f"""
+import json, os
+from types import SimpleNamespace as NS
+from llm_utils import register_provider
+from pipeline_advanced import generate_pipeline
+register_provider('Mock', lambda p, s, k, t: json.dumps([{{'start': 0, 'end': 3, 'content': 'x'}}]) if s else '["t"]')
+zip_path = generate_pipeline(None, NS(name={fx['video']!r}), NS(name={fx['srt']!r}), 'Mock', '', 'key', 1, 4, 1,
+                             '9:16', 'Center', True, True, 'Auto', '', 'TikTok', {os.path.join(d, 'out')!r}, None,
+                             logger=lambda m: None)
+assert zip_path and os.path.exists(zip_path), zip_path
+"""
+        assert _loaded_after(code) == []
+
+
+def test_llm_sdks_load_on_first_use():
+    """Importing llm_utils (or registering a provider) loads neither LLM SDK"""
+    code = ("import sys\nfrom llm_utils import register_provider\nregister_provider('Mock', lambda *a: '[]')\n"
+            "assert 'openai' not in sys.modules and 'google.generativeai' not in sys.modules\n")
+    assert _loaded_after(code) == []
+
+
+if __name__ == "__main__":
+    test_help_is_lightweight()
+    test_srt_only_pipeline_skips_vision_and_asr()
+    test_llm_sdks_load_on_first_use()
+    print("✓ Lazy import tests passed")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-aspect fan-out rendering from a single decode
+"""
+
+import os
+import tempfile
+
+from media_fixtures import ensure_ffmpeg_on_path, fixtures
+from frame_pipeline import CropTarget, probe_video, render_crops
+from pipeline_advanced import parse_aspects
+from trace_utils import disable_profiling, enable_profiling
+from video_utils import crop_path_from_centers, output_resolution, plan_geometry
+
+
+def test_parse_aspects():
+    assert parse_aspects('9:16') == ['9:16']
+    assert parse_aspects('9:16, 1:1,9:16') == ['9:16', '1:1']
+    assert parse_aspects(['16:9', '1:1']) == ['16:9', '1:1']
+    assert output_resolution('1:1') == (1080, 1080) and output_resolution('4:5') == (1080, 1350)
+
+
+def test_crop_path_from_shared_centers():
+    """One set of face centers yields a clamped crop path per aspect"""
+    centers = [(0.0, 20.0, 180.0), (0.5, 620.0, 180.0)]
+    tall = crop_path_from_centers(centers, 640, 360, '9:16')
+    square = crop_path_from_centers(centers, 640, 360, '1:1')
+    assert tall == [(0.0, 0, 0), (0.5, 640 - 202, 0)]
+    assert square == [(0.0, 0, 0), (0.5, 640 - 360, 0)]
+
+
+def test_render_crops_decodes_once():
+    """Every aspect is encoded from the same decoded frames"""
+    ensure_ffmpeg_on_path()
+    with tempfile.TemporaryDirectory() as d:
+        fx = fixtures('tiny', d)
+        info = probe_video(fx['video'])
+        targets = [CropTarget(os.path.join(d, f'{n}.mp4'), r, None) for n, r in (('a', '9:16'), ('b', '1:1'), ('c', '16:9'))]
+        tracer = enable_profiling()
+        try:
+            outs = render_crops(fx['video'], 1.0, 3.0, targets, 'preview', info=info)
+        finally:
+            disable_profiling()
+        rec = [r for r in tracer.records if r['name'] == 'render_crops'][0]
+        assert rec['frames'] == int(2.0 * info.fps)
+        for tgt, out in zip(targets, outs):
+            got = probe_video(out)
+            # The 320x180 source's crops are all below 480p, so none of them is upscaled.
+            assert (got.width, got.height) == plan_geometry(info.width, info.height, tgt.ratio, 'preview')[:2]
+            assert abs(got.duration - 2.0) < 0.2 and got.has_audio
+
+
+if __name__ == "__main__":
+    test_parse_aspects()
+    test_crop_path_from_shared_centers()
+    test_render_crops_decodes_once()
+    print("✓ Multi-aspect tests passed")
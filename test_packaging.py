@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental and streaming ZIP packaging
+"""
+
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+
+from package_utils import ClipPackager, send_zip_stream, stream_zip
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_packager_stores_media_and_deflates_text():
+    """MP4s are stored uncompressed, text is deflated, duplicates are skipped"""
+    with tempfile.TemporaryDirectory() as d:
+        clip = _write(os.path.join(d, 'short_1.mp4'), os.urandom(20_000))
+        srt = _write(os.path.join(d, 'short_1.srt'), b'1\n00:00:00,000 --> 00:00:01,000\nhi\n\n' * 50)
+        zip_path = os.path.join(d, 'out.zip')
+        with ClipPackager(zip_path) as p:
+            assert p.add(clip, 'short_1.mp4')
+            assert p.add(srt, 'short_1.srt')
+            assert not p.add(clip, 'short_1.mp4')
+            assert not p.add(os.path.join(d, 'missing.mp4'))
+        with zipfile.ZipFile(zip_path) as z:
+            assert z.getinfo('short_1.mp4').compress_type == zipfile.ZIP_STORED
+            assert z.getinfo('short_1.srt').compress_type == zipfile.ZIP_DEFLATED
+            assert z.testzip() is None
+
+
+def test_stream_zip_yields_before_last_file_exists():
+    """The first clip's bytes are streamed while the second clip is still 'rendering'"""
+    with tempfile.TemporaryDirectory() as d:
+        first = _write(os.path.join(d, 'a.mp4'), os.urandom(50_000))
+        second = os.path.join(d, 'b.mp4')
+        rendered = threading.Event()
+
+        def entries():
+            yield first, 'a.mp4'
+            rendered.wait(10)
+            _write(second, os.urandom(30_000))
+            yield second, 'b.mp4'
+
+        chunks = stream_zip(entries())
+        head = next(chunks)
+        assert head.startswith(b'PK') and not os.path.exists(second)
+        rendered.set()
+        data = head + b''.join(chunks)
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            assert z.namelist() == ['a.mp4', 'b.mp4']
+            with open(second, 'rb') as f:
+                assert z.read('b.mp4') == f.read()
+
+
+def test_send_zip_stream_over_http():
+    """A chunked HTTP response delivers a valid archive"""
+    with tempfile.TemporaryDirectory() as d:
+        clip = _write(os.path.join(d, 'c.mp4'), os.urandom(3_000_000))
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                send_zip_stream(self, stream_zip([(clip, 'c.mp4')]))
+
+            def log_message(self, *args):
+                pass
+
+        srv = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        try:
+            with urlopen(f'http://127.0.0.1:{srv.server_address[1]}/') as r:
+                assert r.headers['Transfer-Encoding'] == 'chunked'
+                data = r.read()
+        finally:
+            srv.shutdown()
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            assert z.testzip() is None
+            assert z.getinfo('c.mp4').file_size == 3_000_000
+
+
+if __name__ == "__main__":
+    test_packager_stores_media_and_deflates_text()
+    test_stream_zip_yields_before_last_file_exists()
+    test_send_zip_stream_over_http()
+    print("✓ Packaging tests passed")
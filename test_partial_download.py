@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for window-only downloads: container index parsing and partial MP4 copies
+"""
+
+import os
+import subprocess
+import tempfile
+
+import imageio_ffmpeg
+
+from download_utils import SourceCache, StreamInfo, fetch_partial, start_source_download
+from mp4_index import file_fetch, load_index
+from test_download import FILES, RangeHandler, _serve
+
+FFMPEG = imageio_ffmpeg.get_ffmpeg_exe()
+WINDOW = (20.0, 22.0)
+
+
+def _make_sources(d):
+    """30s test clip as a classic (faststart) MP4 and as a fragmented MP4 with sidx"""
+    classic = os.path.join(d, 'classic.mp4')
+    frag = os.path.join(d, 'frag.mp4')
+    subprocess.run([FFMPEG, '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=size=320x240:rate=25',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100', '-t', '30',
+                    '-c:v', 'libx264', '-g', '25', '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+                    '-movflags', '+faststart', classic], check=True)
+    subprocess.run([FFMPEG, '-v', 'error', '-y', '-i', classic, '-c', 'copy',
+                    '-movflags', 'frag_keyframe+empty_moov+default_base_moof+global_sidx', frag], check=True)
+    return classic, frag
+
+
+def _refragment(src, dest, flags):
+    subprocess.run([FFMPEG, '-v', 'error', '-y', '-i', src, '-c', 'copy', '-movflags', flags, dest], check=True)
+    return dest
+
+
+def _counting(fetch):
+    calls = []
+
+    def counted(offset, length):
+        calls.append((offset, length))
+        return fetch(offset, length)
+    return counted, calls
+
+
+def _frame_hashes(path, t0, t1):
+    r = subprocess.run([FFMPEG, '-v', 'error', '-ss', str(t0), '-i', path, '-t', str(t1 - t0),
+                        '-map', '0:v', '-f', 'framemd5', '-'], capture_output=True, text=True, check=True)
+    return [l.split(',')[-1].strip() for l in r.stdout.splitlines() if not l.startswith('#')], r.stderr
+
+
+def test_index_and_partial_copies():
+    """Partial copies decode to exactly the same frames as the original inside the window"""
+    with tempfile.TemporaryDirectory() as d:
+        for src in _make_sources(d):
+            size = os.path.getsize(src)
+            index = load_index(file_fetch(src), size)
+            assert index.fragmented == src.endswith('frag.mp4')
+            if not index.fragmented:
+                assert sorted(t.kind for t in index.tracks) == ['soun', 'vide']
+
+            with open(src, 'rb') as f:
+                FILES['/src.mp4'] = f.read()
+            srv, base = _serve(RangeHandler)
+            try:
+                dest = fetch_partial(base + '/src.mp4', os.path.join(d, 'partial.mp4'), [WINDOW], pad=0.5,
+                                     chunk_size=16_000)
+            finally:
+                srv.shutdown()
+                del FILES['/src.mp4']
+
+            _, plan, _ = index.partial_layout([WINDOW], 0.5)
+            assert sum(b - a for a, b, _ in plan) < size * 0.4
+            want, _ = _frame_hashes(src, *WINDOW)
+            got, err = _frame_hashes(dest, *WINDOW)
+            assert len(want) == 50
+            assert got == want
+            assert not err.strip(), err
+
+
+def test_index_scan_skips_indexed_fragments():
+    """A global sidx is found without walking the fragments after it"""
+    with tempfile.TemporaryDirectory() as d:
+        _, frag = _make_sources(d)
+        fetch, calls = _counting(file_fetch(frag))
+        index = load_index(fetch, os.path.getsize(frag))
+        assert len(index.segments) == 30
+        assert len(calls) <= 4, calls
+
+
+def test_per_fragment_sidx_and_missing_sidx():
+    """sidx boxes before every fragment are merged; a fragmented file without any sidx fails fast and loudly"""
+    with tempfile.TemporaryDirectory() as d:
+        classic, frag = _make_sources(d)
+        dash = _refragment(classic, os.path.join(d, 'dash.mp4'), 'frag_keyframe+empty_moov+default_base_moof+dash')
+        index = load_index(file_fetch(dash), os.path.getsize(dash))
+        assert index.fragmented and len(index.segments) == 30
+        assert [t0 for t0, *_ in index.segments] == sorted(t0 for t0, *_ in index.segments)
+        with open(dash, 'rb') as f:
+            FILES['/dash.mp4'] = f.read()
+        srv, base = _serve(RangeHandler)
+        try:
+            dest = fetch_partial(base + '/dash.mp4', os.path.join(d, 'partial.mp4'), [WINDOW], pad=0.5)
+        finally:
+            srv.shutdown()
+            del FILES['/dash.mp4']
+        assert os.path.getsize(dest) < os.path.getsize(dash) * 0.4
+        # Compared with the global-sidx copy of the same fragments: seeking inside the
+        # per-fragment original lands a couple of frames late.
+        want, _ = _frame_hashes(frag, *WINDOW)
+        got, err = _frame_hashes(dest, *WINDOW)
+        assert got == want and not err.strip(), err
+
+        bare = _refragment(classic, os.path.join(d, 'bare.mp4'), 'frag_keyframe+empty_moov+default_base_moof')
+        fetch, calls = _counting(file_fetch(bare))
+        try:
+            load_index(fetch, os.path.getsize(bare))
+            assert False, "expected a fragmented file without sidx to be rejected"
+        except ValueError as ex:
+            assert 'sidx' in str(ex)
+        assert len(calls) <= 2, calls
+
+        # The partial download falls back to the whole file and says so.
+        with open(bare, 'rb') as f:
+            FILES['/bare.mp4'] = f.read()
+        srv, base = _serve(RangeHandler)
+        logs = []
+        try:
+            video = StreamInfo(18, base + '/bare.mp4', len(FILES['/bare.mp4']), 'mp4', True)
+            src = start_source_download('bare1', None, video, SourceCache(os.path.join(d, 'cache')),
+                                        logger=logs.append, fetch_video=False)
+            path = src.video_windows([WINDOW])
+            with open(path, 'rb') as f:
+                assert f.read() == FILES['/bare.mp4']
+        finally:
+            srv.shutdown()
+            del FILES['/bare.mp4']
+        assert any('downloading the full video' in m and 'sidx' in m for m in logs), logs
+
+
+if __name__ == "__main__":
+    test_index_and_partial_copies()
+    test_index_scan_skips_indexed_fragments()
+    test_per_fragment_sidx_and_missing_sidx()
+    print("✓ Partial download tests passed")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-stage profiling spans and exporters
+"""
+
+import json
+import os
+import tempfile
+
+import trace_utils
+from trace_utils import disable_profiling, enable_profiling, span, traced
+
+
+@traced('decorated_stage')
+def _work(n):
+    return sum(i * i for i in range(n))
+
+
+def test_spans_disabled_by_default():
+    """Without --profile spans are no-ops and record nothing"""
+    disable_profiling()
+    with span('noop') as sp:
+        sp.frames += 10
+    assert not trace_utils.get_tracer().enabled
+
+
+def test_jsonl_and_prometheus_output():
+    """Each span becomes a JSON line; totals are exported per stage"""
+    with tempfile.TemporaryDirectory() as d:
+        jsonl = os.path.join(d, 'profile.jsonl')
+        prom = os.path.join(d, 'metrics.prom')
+        out = os.path.join(d, 'out.bin')
+        enable_profiling(jsonl, prom)
+        try:
+            with span('write_videofile', tier='preview') as sp:
+                with open(out, 'wb') as f:
+                    f.write(os.urandom(100_000))
+                sp.frames = 250
+                sp.add_file_io(written_path=out)
+            _work(200_000)
+            _work(10)
+        finally:
+            disable_profiling()
+
+        with open(jsonl) as f:
+            recs = [json.loads(l) for l in f]
+        assert [r['name'] for r in recs] == ['write_videofile', 'decorated_stage', 'decorated_stage']
+        first = recs[0]
+        for key in ('wall_s', 'cpu_s', 'peak_rss_bytes', 'frames', 'bytes_read', 'bytes_written'):
+            assert key in first
+        assert first['frames'] == 250 and first['tier'] == 'preview'
+        assert first['peak_rss_bytes'] > 0
+        # Only the file the stage reports counts, not pipe or other threads' traffic.
+        assert first['bytes_written'] == 100_000 and first['bytes_read'] == 0
+        assert recs[1]['cpu_s'] > 0 and recs[1]['process_cpu_s'] >= recs[1]['cpu_s'] * 0.9
+
+        with open(prom) as f:
+            text = f.read()
+        assert 'shorts_stage_calls_total{stage="decorated_stage"} 2' in text
+        assert 'shorts_stage_frames_total{stage="write_videofile"} 250' in text
+        assert '# TYPE shorts_stage_wall_seconds_total counter' in text
+
+
+if __name__ == "__main__":
+    test_spans_disabled_by_default()
+    test_jsonl_and_prometheus_output()
+    print("✓ Tracing tests passed")
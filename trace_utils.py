@@ -0,0 +1,176 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _rusage():
+    """(this thread's cpu seconds, process cpu seconds, children cpu seconds, peak rss bytes).
+
+    Children are the waited-for subprocesses (ffmpeg). The process and children figures
+    and the peak RSS are process-wide, so they include other threads' (and jobs') work;
+    without the resource module only the cpu times of this process are known.
+    """
+    if resource is None:
+        return time.thread_time(), time.process_time(), 0.0, 0
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux
+    return (time.thread_time(), me.ru_utime + me.ru_stime, ch.ru_utime + ch.ru_stime,
+            max(me.ru_maxrss, ch.ru_maxrss) * 1024)
+
+
+class Span:
+    """One timed stage. Frames and file bytes are counted by the caller (add_file_io)."""
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.frames = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.record: Dict = {}
+
+    def add_file_io(self, read_path: Optional[str] = None, written_path: Optional[str] = None):
+        for p, attr in ((read_path, 'bytes_read'), (written_path, 'bytes_written')):
+            if p and os.path.exists(p):
+                setattr(self, attr, getattr(self, attr) + os.path.getsize(p))
+
+
+class Tracer:
+    """Records spans to a JSON-lines file and keeps per-stage totals for Prometheus."""
+
+    def __init__(self, jsonl_path: Optional[str] = None, prom_path: Optional[str] = None):
+        self.enabled = True
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+        self._fh = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        sp = Span(name, attrs)
+        tcpu0, pcpu0, ccpu0, _ = _rusage()
+        t0 = time.perf_counter()
+        start = time.time()
+        try:
+            yield sp
+        finally:
+            wall = time.perf_counter() - t0
+            tcpu1, pcpu1, ccpu1, rss = _rusage()
+            # cpu_s: the span's own thread plus ffmpeg children; process_cpu_s also counts
+            # every other thread (crop workers, concurrent jobs) running meanwhile.
+            rec = {
+                'name': name, 'start': round(start, 3), 'wall_s': round(wall, 6),
+                'cpu_s': round((tcpu1 - tcpu0) + (ccpu1 - ccpu0), 6),
+                'process_cpu_s': round((pcpu1 - pcpu0) + (ccpu1 - ccpu0), 6),
+                'peak_rss_bytes': rss, 'frames': sp.frames,
+                'bytes_read': sp.bytes_read, 'bytes_written': sp.bytes_written,
+                'thread': threading.current_thread().name,
+            }
+            rec.update({k: v for k, v in sp.attrs.items() if k not in rec})
+            sp.record = rec
+            self._emit(rec)
+
+    def _emit(self, rec: Dict):
+        with self._lock:
+            self.records.append(rec)
+            if self._fh:
+                self._fh.write(json.dumps(rec, default=str) + '\n')
+                self._fh.flush()
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for r in self.records:
+                t = out.setdefault(r['name'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'frames': 0,
+                                               'bytes_read': 0, 'bytes_written': 0, 'peak_rss_bytes': 0})
+                t['calls'] += 1
+                for k in ('wall_s', 'cpu_s', 'frames', 'bytes_read', 'bytes_written'):
+                    t[k] += r[k]
+                t['peak_rss_bytes'] = max(t['peak_rss_bytes'], r['peak_rss_bytes'])
+        return out
+
+    def prometheus_text(self, prefix: str = 'shorts_stage') -> str:
+        metrics = [
+            ('calls', 'calls_total', 'counter', 'Number of times the stage ran'),
+            ('wall_s', 'wall_seconds_total', 'counter', 'Wall-clock seconds spent in the stage'),
+            ('cpu_s', 'cpu_seconds_total', 'counter', 'CPU seconds of the stage thread and its ffmpeg children'),
+            ('frames', 'frames_total', 'counter', 'Frames processed by the stage'),
+            ('bytes_read', 'read_bytes_total', 'counter', 'Bytes read by the stage'),
+            ('bytes_written', 'written_bytes_total', 'counter', 'Bytes written by the stage'),
+            ('peak_rss_bytes', 'peak_rss_bytes', 'gauge', 'Process-wide peak RSS at the end of the stage'),
+        ]
+        totals = self.totals()
+        lines = []
+        for key, suffix, kind, help_text in metrics:
+            name = f"{prefix}_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, t in sorted(totals.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {t[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.prom_path:
+            with open(self.prom_path, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text())
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+
+
+class _NullTracer:
+    enabled = False
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Span]:
+        yield Span(name, attrs)
+
+    def close(self):
+        pass
+
+
+_TRACER = _NullTracer()
+
+
+def get_tracer():
+    return _TRACER
+
+
+def enable_profiling(jsonl_path: Optional[str] = None, prom_path: Optional[str] = None) -> Tracer:
+    global _TRACER
+    _TRACER.close()
+    _TRACER = Tracer(jsonl_path, prom_path)
+    return _TRACER
+
+
+def disable_profiling():
+    global _TRACER
+    _TRACER.close()
+    _TRACER = _NullTracer()
+
+
+def span(name: str, **attrs):
+    """Context manager for a stage span; a no-op unless profiling is enabled."""
+    return _TRACER.span(name, **attrs)
+
+
+def traced(name: str):
+    """Decorator form of span() for whole functions."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _TRACER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
@@ -1,9 +1,21 @@
 import os
-from typing import Tuple, Optional, List, Callable
+from collections import namedtuple
+from typing import TYPE_CHECKING, Tuple, Optional, List, Iterable
 import numpy as np
-import cv2
-from moviepy import VideoFileClip
-from moviepy.video.fx import Crop as mp_crop
+
+# cv2 is imported inside the functions that need it, so center-crop and SRT-only runs
+# (and `--help`) never load OpenCV.
+if TYPE_CHECKING:
+    import cv2
+
+from trace_utils import span
+from concurrency_utils import stage_slot
+from encode_profiles import DEFAULT_TIER, get_profile
+from frame_pipeline import CropTarget, Overlay, probe_video, read_frames, render_crops
+
+
+# Platform output size per aspect ratio (also the karaoke ASS PlayRes).
+OUTPUT_RESOLUTIONS = {'9:16': (1080, 1920), '16:9': (1920, 1080), '1:1': (1080, 1080)}
 
 
 def aspect_tuple(s: str) -> Tuple[int, int]:
@@ -11,6 +23,18 @@ def aspect_tuple(s: str) -> Tuple[int, int]:
     return int(a), int(b)
 
 
+def aspect_tag(ratio: str) -> str:
+    """File-name friendly ratio, e.g. '9:16' -> '9x16'."""
+    return ratio.replace(':', 'x')
+
+
+def output_resolution(ratio: str) -> Tuple[int, int]:
+    if ratio in OUTPUT_RESOLUTIONS:
+        return OUTPUT_RESOLUTIONS[ratio]
+    aw, ah = aspect_tuple(ratio)
+    return (1080, int(round(1080 * ah / aw / 2)) * 2) if aw <= ah else (int(round(1080 * aw / ah / 2)) * 2, 1080)
+
+
 def compute_center_crop(w: int, h: int, ratio: str) -> Tuple[int, int, int, int]:
     aw, ah = aspect_tuple(ratio)
     tr = aw / ah
@@ -25,21 +49,117 @@ def compute_center_crop(w: int, h: int, ratio: str) -> Tuple[int, int, int, int]
         ch = int(w / tr)
         x = 0
         y = (h - ch) // 2
+    # libx264/yuv420p needs even dimensions
+    if cw % 2:
+        cw -= 1
+        x = (w - cw) // 2
+    if ch % 2:
+        ch -= 1
+        y = (h - ch) // 2
     return x, y, cw, ch
 
 
-def crop_center(v: VideoFileClip, ratio: str) -> VideoFileClip:
-    x, y, cw, ch = compute_center_crop(v.w, v.h, ratio)
-    return mp_crop(v, x1=x, y1=y, width=cw, height=ch).resize((cw, ch))
+class Geometry(namedtuple('Geometry', 'crop_w crop_h out_w out_h')):
+    """Source crop window and output size of one render target.
+
+    Each output frame is one crop (a copy of the window, no resampling) and at most one
+    scale straight to the output size; identity geometry skips the scale entirely.
+    """
+
+    @property
+    def identity(self) -> bool:
+        return (self.crop_w, self.crop_h) == (self.out_w, self.out_h)
+
+    def __str__(self) -> str:
+        return f"{self.crop_w}x{self.crop_h}->{self.out_w}x{self.out_h}"
+
+
+def target_size(ratio: str, tier: str = DEFAULT_TIER,
+                crop: Optional[Tuple[int, int]] = None) -> Tuple[int, int]:
+    """Output size for a ratio: the platform resolution, capped to the tier's max height.
+
+    With crop (the source crop window) the result is never larger than the crop: a
+    crop at or below the platform size is kept as-is instead of being upscaled.
+    """
+    ow, oh = output_resolution(ratio)
+    mh = get_profile(tier)['max_height']
+    if mh and oh > mh:
+        ow, oh = int(round(ow * mh / oh / 2)) * 2, mh
+    if crop and (crop[0] <= ow or crop[1] <= oh):
+        return crop[0], crop[1]
+    return ow, oh
+
+
+def plan_geometry(w: int, h: int, ratio: str, tier: str = DEFAULT_TIER,
+                  size: Optional[Tuple[int, int]] = None) -> Geometry:
+    """Crop window for ratio in a w x h source and the size it is scaled to.
+
+    By default that is target_size capped to the crop, so frames are only ever scaled
+    down; pass size to force an output size (including an upscale).
+    """
+    _, _, cw, ch = compute_center_crop(w, h, ratio)
+    ow, oh = size or target_size(ratio, tier, (cw, ch))
+    return Geometry(cw, ch, ow, oh)
+
+
+def crop_center(src: str, out_path: str, ratio: str, t0: float = 0.0, t1: Optional[float] = None,
+                tier: str = DEFAULT_TIER, size: Optional[Tuple[int, int]] = None) -> str:
+    """Center-crop [t0, t1) of src (whole file by default) to ratio.
+
+    size defaults to the platform size, never above the crop (plan_geometry).
+    """
+    info = probe_video(src)
+    return render_crops(src, t0, info.duration if t1 is None else t1, [CropTarget(out_path, ratio, None, size)],
+                        tier, info=info)[0]
+
+
+# -------------- Title card & watermark --------------
+# Static overlays are drawn once per output with Pillow and blended into each frame by
+# render_crops' crop threads (frame_pipeline.Overlay). They are drawn at the crop size,
+# before the encoder's scale, with sizes relative to the output height.
+TITLE_FONTS = ('FreeMono.ttf', 'DejaVuSans-Bold.ttf')
+
+
+def _title_font(size: int):
+    from PIL import ImageFont
+    for name in TITLE_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def title_overlay(text: str, geo: Geometry, platform: str = 'TikTok') -> Overlay:
+    """Title card centered near the top (white with a black outline)."""
+    from PIL import Image, ImageDraw
+    k = geo.crop_h / geo.out_h
+    canvas = Image.new('RGBA', (geo.crop_w, geo.crop_h), (0, 0, 0, 0))
+    margin = int((0.10 if platform == 'TikTok' else 0.08) * geo.crop_h)
+    ImageDraw.Draw(canvas).text((geo.crop_w / 2, margin), text, font=_title_font(int(max(36, geo.out_h * 0.05) * k)),
+                                fill='white', stroke_width=max(1, round(2 * k)), stroke_fill='black',
+                                anchor='ma', align='center')
+    return Overlay(np.asarray(canvas))
+
+
+def watermark_overlay(image_path: str, geo: Geometry) -> Overlay:
+    """Watermark image in the top-right corner, 6% of the output height (at least 48 px)."""
+    from PIL import Image
+    with Image.open(image_path) as im:
+        wm = im.convert('RGBA')
+    h = min(geo.crop_h, max(1, int(max(48, geo.out_h * 0.06) * geo.crop_h / geo.out_h)))
+    wm = wm.resize((min(geo.crop_w, max(1, round(wm.width * h / wm.height))), h), Image.LANCZOS)
+    return Overlay(np.asarray(wm), geo.crop_w - wm.width, 0)
 
 
 # -------------- Face detection & tracking --------------
-_HAAR: Optional[cv2.CascadeClassifier] = None
+_HAAR: Optional['cv2.CascadeClassifier'] = None
 
 def _load_haar():
     global _HAAR
     if _HAAR is None:
         try:
+            import cv2
             candidates = []
             haar_dir = getattr(cv2.data, 'haarcascades', '')
             if haar_dir:
@@ -59,6 +179,7 @@ def detect_face(frame) -> Optional[Tuple[int, int, int, int]]:
     _load_haar()
     if _HAAR is None:
         return None
+    import cv2
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     det = _HAAR.detectMultiScale(gray, 1.2, 3)
     if len(det) == 0:
@@ -67,62 +188,78 @@ def detect_face(frame) -> Optional[Tuple[int, int, int, int]]:
     return int(det[0]), int(det[1]), int(det[2]), int(det[3])
 
 
-def crop_face_track(v: VideoFileClip, ratio: str, sample_fps: float = 4.0, smooth: float = 0.8) -> VideoFileClip:
-    aw, ah = aspect_tuple(ratio)
-    tr = aw / ah
-    w, h = v.w, v.h
-    sr = w / h
-    if sr > tr:
-        ch = h
-        cw = int(h * tr)
-    else:
-        cw = w
-        ch = int(w / tr)
-    duration = v.duration
-    times = np.arange(0, duration, 1.0/max(1.0, sample_fps))
-    path: List[Tuple[float, int, int]] = []
+def crop_size(w: int, h: int, ratio: str) -> Tuple[int, int]:
+    _, _, cw, ch = compute_center_crop(w, h, ratio)
+    return cw, ch
+
+
+FaceBox = Optional[Tuple[int, int, int, int]]
+
+
+def detect_boxes(frames: Iterable[Tuple[float, np.ndarray]]) -> List[Tuple[float, FaceBox]]:
+    """Largest face box (x, y, w, h) or None for each sampled frame."""
+    out: List[Tuple[float, FaceBox]] = []
+    with stage_slot('cpu'), span('crop_face_track') as sp:
+        for t, frame in frames:
+            sp.frames += 1
+            try:
+                out.append((float(t), detect_face(frame)))
+            except Exception:
+                out.append((float(t), None))
+    return out
+
+
+def smooth_centers(boxes: Iterable[Tuple[float, FaceBox]], w: int, h: int,
+                   smooth: float = 0.8) -> List[Tuple[float, float, float]]:
+    """Exponentially smoothed face centers (t, cx, cy); frames without a face hold the last center."""
+    centers: List[Tuple[float, float, float]] = []
     prev = None
-    for t in times:
-        try:
-            frame = v.get_frame(t)
-            b = detect_face(frame)
-            if b:
-                x, y, bw, bh = b
-                cx, cy = x + bw/2, y + bh/2
-            else:
-                cx, cy = prev if prev else (w/2, h/2)
-            if prev is None:
-                sx, sy = cx, cy
-            else:
-                sx = smooth*prev[0] + (1-smooth)*cx
-                sy = smooth*prev[1] + (1-smooth)*cy
-            prev = (sx, sy)
-            x1 = max(0, min(w - cw, int(sx - cw/2)))
-            y1 = max(0, min(h - ch, int(sy - ch/2)))
-            path.append((t, x1, y1))
-        except Exception:
-            continue
-    if not path:
-        return crop_center(v, ratio)
-    ts = [p[0] for p in path]
-    xs = [p[1] for p in path]
-    ys = [p[2] for p in path]
-
-    def interp(series: List[int]) -> Callable[[float], float]:
-        def f(t: float) -> float:
-            if t <= ts[0]:
-                return float(series[0])
-            if t >= ts[-1]:
-                return float(series[-1])
-            i = max(0, np.searchsorted(ts, t) - 1)
-            t0, t1 = ts[i], ts[i+1]
-            v0, v1 = series[i], series[i+1]
-            if t1 == t0:
-                return float(v1)
-            a = (t - t0) / (t1 - t0)
-            return float(v0*(1-a) + v1*a)
-        return f
-
-    fx = interp(xs)
-    fy = interp(ys)
-    return mp_crop(v, x1=lambda t: fx(t), y1=lambda t: fy(t), width=cw, height=ch).resize((cw, ch))
+    for t, b in boxes:
+        if b:
+            x, y, bw, bh = b
+            cx, cy = x + bw/2, y + bh/2
+        else:
+            cx, cy = prev if prev else (w/2, h/2)
+        if prev is None:
+            sx, sy = cx, cy
+        else:
+            sx = smooth*prev[0] + (1-smooth)*cx
+            sy = smooth*prev[1] + (1-smooth)*cy
+        prev = (sx, sy)
+        centers.append((float(t), sx, sy))
+    return centers
+
+
+def face_centers(frames: Iterable[Tuple[float, np.ndarray]], w: int, h: int,
+                 smooth: float = 0.8) -> List[Tuple[float, float, float]]:
+    """Smoothed face centers (t, cx, cy) from sampled frames; independent of the output aspect."""
+    return smooth_centers(detect_boxes(frames), w, h, smooth)
+
+
+def crop_path_from_centers(centers: List[Tuple[float, float, float]], w: int, h: int,
+                           ratio: str) -> List[Tuple[float, int, int]]:
+    """Crop path (t, x1, y1) for one aspect ratio, keeping each face center in frame."""
+    cw, ch = crop_size(w, h, ratio)
+    return [(t, max(0, min(w - cw, int(cx - cw/2))), max(0, min(h - ch, int(cy - ch/2)))) for t, cx, cy in centers]
+
+
+def face_track_path(src: str, ratio: str, t0: float = 0.0, t1: Optional[float] = None, sample_fps: float = 4.0,
+                    smooth: float = 0.8) -> List[Tuple[float, int, int]]:
+    """Sample faces in [t0, t1) of src and return the smoothed crop path as (t, x1, y1) tuples."""
+    info = probe_video(src)
+    t1 = info.duration if t1 is None else t1
+    centers = face_centers(read_frames(src, t0, t1, fps=sample_fps, info=info), info.width, info.height, smooth)
+    return crop_path_from_centers(centers, info.width, info.height, ratio)
+
+
+def crop_face_track(src: str, out_path: str, ratio: str, t0: float = 0.0, t1: Optional[float] = None,
+                    sample_fps: float = 4.0, smooth: float = 0.8, tier: str = DEFAULT_TIER,
+                    size: Optional[Tuple[int, int]] = None) -> str:
+    """Crop [t0, t1) of src to ratio following the largest face.
+
+    size defaults to the platform size, never above the crop (plan_geometry).
+    """
+    info = probe_video(src)
+    t1 = info.duration if t1 is None else t1
+    path = face_track_path(src, ratio, t0, t1, sample_fps, smooth)
+    return render_crops(src, t0, t1, [CropTarget(out_path, ratio, path, size)], tier, info=info)[0]